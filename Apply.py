@@ -30,7 +30,7 @@ from Configurator.Characterizer import Characterizer
 from Configurator.ProblemSuite import ProblemSuite
 from Configurator.ConfigurationDefinition import Configuration, ConfigurationDefinition
 from Configurator.TerminationCondition import FELimit
-from Configurator.Algorithm import Algorithm
+from Configurator.Algorithm import Algorithm, CallableAlgorithm, PersistentAlgorithm
 import argparse
 import json
 from pathlib import Path
@@ -92,9 +92,11 @@ def main():
     REPETITIONSPERRUN = algorithmDef["repetitionsPerRun"] 
     BLINDRUNSPERPROBLEM = algorithmDef["blindRunsPerProblem"]
     TARGETALGORITHM = algorithmDef["targetAlgorithm"]
+    TARGETALGORITHMMODE = algorithmDef["targetAlgorithmMode"]
     STATICARGS = algorithmDef["staticArgs"]
     STRICTCONSTRAINTS = algorithmDef["strictConstraints"]
     THREADS = algorithmDef["threads"]
+    INFERENCESERVER = algorithmDef["inferenceServer"]
     PATHTOMODEL = algorithmDef["pathToModel"] 
 
     #If the results path exists, remove it and all contained files 
@@ -109,7 +111,14 @@ def main():
 
     rng = Random(seed)
 
-    alg = Algorithm(TARGETALGORITHM, STATICARGS, STRICTCONSTRAINTS==False, ALGORITHMSTORAGEPATH) 
+    if TARGETALGORITHMMODE == "process":
+        alg = Algorithm(TARGETALGORITHM, STATICARGS, STRICTCONSTRAINTS==False, ALGORITHMSTORAGEPATH) 
+    elif TARGETALGORITHMMODE == "server":
+        alg = PersistentAlgorithm(TARGETALGORITHM, STATICARGS, STRICTCONSTRAINTS==False, ALGORITHMSTORAGEPATH) 
+    elif TARGETALGORITHMMODE == "callable":
+        alg = CallableAlgorithm(TARGETALGORITHM, STATICARGS, STRICTCONSTRAINTS==False, ALGORITHMSTORAGEPATH) 
+    else:
+        raise Exception("Target algorithm mode not recognized.")
 
     termination = FELimit(RUNFELIMIT)
     
@@ -124,7 +133,7 @@ def main():
 
     model = initModel(modelState, rng.randint(0,4000000000))
 
-    runner = RandomInstanceRunner(suite, characterizer, termination, rng.randint(0,4000000000), alg, THREADS)
+    runner = RandomInstanceRunner(suite, characterizer, termination, rng.randint(0,4000000000), alg, THREADS, INFERENCESERVER)
 
     if WORKINMEMORY:
         configDB = sqlite3ConfigurationDB(path=":memory:", initialize=True,seed=rng.randint(0,4000000000))
@@ -186,7 +195,7 @@ def main():
 
     #do the work, yawn 
 
-    #making processes/process objects is expensive (wrt memory), so we schedule them in chunks
+    #we schedule the work in chunks to bound the number of jobs (and copies of the model state) waiting to be sent to the workers
     chunkSize = 512 #a nice big chunk of work, with managable memory requirements 
 
     for i in range(0, len(todo), chunkSize):
@@ -195,12 +204,14 @@ def main():
             end = len(todo) 
         
         todoNow = todo[i:end]
-        runs = runner.schedule(0, 0, model, todoNow)
 
-        #save the results 
-        for run in runs:
-            run.performedOnIteration = 0 
-            configDB.addRun(run) 
+        #save the results as they finish, in the order they were scheduled 
+        for runs in runner.streamBatches(0, 0, model, todoNow):
+            for run in runs:
+                run.performedOnIteration = 0 
+            configDB.addRuns(runs) 
+
+    runner.close()
 
     if WORKINMEMORY: #We need to write the db from memory out to disk 
         configDB.backup(f"{DBFILE}.sqlite3")
@@ -26,11 +26,18 @@ from Configurator.ConfigurationDefinition import Configuration
 from Configurator.Run import Run 
 from Configurator.Problem import Instance
 from Configurator.TerminationCondition import TerminationCondition
-from Configurator.Characterizer import Characterizer
+from Configurator.Characterizer import Characterizer, SolutionArrays
 from subprocess import Popen, PIPE
+from typing import List
+import importlib
 import json
+import os
 from random import Random
 
+#A generic error 
+class AlgorithmError(Exception):
+    pass
+
 class Algorithm:
 
     def __init__(self, wrapperCall: str, staticArgs: str, evaluateInvalid:bool=False, storagePath: str = "./") -> None:
@@ -69,40 +76,30 @@ class Algorithm:
                 seed = rng.randint(0,4000000000) #A seed for the execution of the target algorithm
                 characterizeSeed = rng.randint(0,4000000000) #A seed for the random sampler in characterize
 
-                #construct our command 
-                toRun = " ".join([self.wrapperCall, str(threadID), str(seed), self.storagePath, self.staticArgs, instance.toFlags(), conf.toFlags(), restore])
-
-                io = Popen(toRun.strip().split(" "), stdout=PIPE, stderr=PIPE)
-
-                #wait for the process to finish 
-                _stdout,_stderr = io.communicate() 
-                output = _stdout.decode()
-
-                err = _stderr.decode() #If you run into issues check out stderr, dont forget to print stderr in the target-algorithm too!
-                if err.strip() != "":
-                    print(err)
-
-                #We expect everything after RESULTS FOLLOW to be the output for LAAC
-                #The output should be properly formatted JSON 
-                #TODO: More informative Errors/Exceptions
-                #print(output)
-                loc = output.find("RESULTS FOLLOW")
-                try:
-                    #TODO: json does not support nan, inf, etc, need to cope with those here 
-                    result = json.loads(output[loc + 14:])
-                except JSONDecodeError:
-                    print(output)
-                    raise ValueError
+                #construct the arguments for the target algorithm
+                args = " ".join([str(threadID), str(seed), self.storagePath, self.staticArgs, instance.toFlags(), conf.toFlags(), restore]).strip().split(" ")
+
+                result = self._execute(args)
                 
+                #The target algorithm may write its solutions and state to a binary file, rather than including them in its output
+                if "resultsFile" in result:
+                    solutions = SolutionArrays.load(result["resultsFile"])
+                else:
+                    solutions = SolutionArrays.fromResults(result)
+
                 # #Finish populating the Configuration with data
-                conf.features = characterizer.characterize(result, characterizeSeed)
+                conf.features = characterizer.characterize(solutions, characterizeSeed)
 
-                conf.quality = result["solutions"][-1]["quality"]
+                conf.quality = float(solutions.quality[-1])
                 
                 #remove the specifc solutions generated to save on space, we have all the seeds and the model, if needed, we can re-generate later
                 if deleteSols:
-                    del result["state"] 
-                    del result["solutions"]
+                    if "resultsFile" in result:
+                        os.remove(result["resultsFile"])
+                        del result["resultsFile"]
+                    else:
+                        del result["state"] 
+                        del result["solutions"]
                 
                 conf.rawResult = result
                 conf.seed = seed 
@@ -120,4 +117,102 @@ class Algorithm:
 
         return theRun
 
+    #Executes the target algorithm once with the provided arguments, and returns its output as a dict
+    def _execute(self, args:List[str]) -> dict:
+        io = Popen(self.wrapperCall.split(" ") + args, stdout=PIPE, stderr=PIPE)
+
+        #wait for the process to finish 
+        _stdout,_stderr = io.communicate() 
+        output = _stdout.decode()
+
+        err = _stderr.decode() #If you run into issues check out stderr, dont forget to print stderr in the target-algorithm too!
+        if err.strip() != "":
+            print(err)
+
+        #We expect everything after RESULTS FOLLOW to be the output for LAAC
+        loc = output.find("RESULTS FOLLOW")
+        return self._parseResult(output[loc + 14:], output)
+
+    #The output should be properly formatted JSON 
+    #TODO: More informative Errors/Exceptions
+    def _parseResult(self, result:str, output:str) -> dict:
+        try:
+            #TODO: json does not support nan, inf, etc, need to cope with those here 
+            return json.loads(result)
+        except JSONDecodeError:
+            print(output)
+            raise ValueError
+
+    #Releases any resources held by the Algorithm, called when a Runner's worker exits
+    def close(self) -> None:
+        pass 
+
+"""
+Runs the target algorithm as a long lived server, rather than starting a new process for each execution. The server is started on first use, so each process using the Algorithm (ie each of a Runner's workers) gets its own server.
+
+The server is started with "<wrapperCall> -server". For each execution LAAC writes a single line to the server's stdin containing a JSON list of the arguments which would otherwise have been passed on the command line. The server should respond on stdout with a line "RESULTS FOLLOW <n>" followed by exactly n bytes of JSON, in the same format expected from a normal execution. Any other lines written before RESULTS FOLLOW are ignored. See target-algorithm.py for an example.
+"""
+class PersistentAlgorithm(Algorithm):
+
+    def __init__(self, wrapperCall: str, staticArgs: str, evaluateInvalid:bool=False, storagePath: str = "./") -> None:
+        super(PersistentAlgorithm, self).__init__(wrapperCall, staticArgs, evaluateInvalid, storagePath)
+        self._server = None 
+
+    def _execute(self, args:List[str]) -> dict:
+        if self._server is None or self._server.poll() is not None:
+            self._server = Popen(self.wrapperCall.split(" ") + ["-server"], stdin=PIPE, stdout=PIPE)
+
+        self._server.stdin.write((json.dumps(args) + "\n").encode())
+        self._server.stdin.flush()
+
+        output = []
+        while True:
+            line = self._server.stdout.readline().decode()
+            if line == "":
+                raise AlgorithmError("The target algorithm server exited unexpectedly\n" + "".join(output))
+
+            if line.startswith("RESULTS FOLLOW"):
+                size = int(line[14:].strip())
+                result = self._server.stdout.read(size).decode()
+                return self._parseResult(result, "".join(output) + line + result)
+
+            output.append(line)
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.stdin.close()
+            self._server.wait()
+            self._server = None
+
+    #The server process can't be sent to another process, the receiving process will start its own
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_server"] = None 
+        return state
+
+"""
+Calls a python target algorithm directly, without starting a new process or serializing its results. 
+
+wrapperCall should be of the form "module:function", where module can be imported by LAAC. The function is called with a list of the arguments which would otherwise have been passed on the command line, and should return the result dict. See execute in target-algorithm.py for an example.
+"""
+class CallableAlgorithm(Algorithm):
+
+    def __init__(self, wrapperCall: str, staticArgs: str, evaluateInvalid:bool=False, storagePath: str = "./") -> None:
+        super(CallableAlgorithm, self).__init__(wrapperCall, staticArgs, evaluateInvalid, storagePath)
+        if wrapperCall.count(":") != 1:
+            raise ValueError("wrapperCall should be of the form module:function. Received: {0}".format(wrapperCall))
+        self._function = None 
+
+    def _execute(self, args:List[str]) -> dict:
+        if self._function is None:
+            module,function = self.wrapperCall.split(":")
+            self._function = getattr(importlib.import_module(module.strip()), function.strip())
+
+        return self._function(args)
+
+    #The function is imported again by each process using the Algorithm
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_function"] = None 
+        return state
 
@@ -23,9 +23,10 @@ Responsible for producing a feature vector from a sequence of solutions.
 #TODO: fix dispersion to 5 sets of summary stats calcualted for the 100 best sols from the sample 
 #TODO: does that change the nearest neighbor calcualtsion?  if so update thesis write up
 
-from ctypes import POINTER, Structure, byref, c_long, cdll,c_double,c_int,c_long
+from ctypes import POINTER, c_long, cdll,c_double,c_int
+from typing import List, Union
 import numpy as np 
-from Configurator.RoC import fit 
+from Configurator.RoC import fitMany 
 import sys 
 import os 
 
@@ -33,21 +34,46 @@ import os
 class CharacterizerError(Exception):
     pass
 
-#A struct for receiving results from the FLA library
-class Characteristics(Structure):
-    _fields_ = [
-        ("FDC", c_double),
-        ("yDist", c_double*2),
-        ("pairwise", c_double*54),
-        ("FEM", c_double),
-        ("grad", c_double*7),
-        ("M", c_double*2),
-        ("stag", c_double*2),
-        ("diversity", POINTER(c_double)),
-        ("gBestStep", POINTER(c_double)),
-        ("gBestStag", POINTER(c_double)),
-        ("gBestyDist", POINTER(c_double))
-    ]
+"""
+The solutions and state produced by one execution of the target algorithm, stored in contiguous arrays. 
+
+solutions is a (numSolutions, dims) array, and quality gives the quality of each solution. 
+state holds the solutions from every entry of the "state" list stacked into one (total, dims) array, with stateQuality giving their qualities. stateSizes gives the number of rows of state belonging to each entry.
+
+Target algorithms can write these arrays directly to an .npz file (see save) and report its path in the "resultsFile" field of their output, instead of including "solutions" and "state" in their JSON output. 
+"""
+class SolutionArrays:
+    def __init__(self, solutions:np.ndarray, quality:np.ndarray, state:np.ndarray, stateQuality:np.ndarray, stateSizes:np.ndarray):
+        self.solutions = np.ascontiguousarray(solutions, dtype=np.float64)
+        self.quality = np.ascontiguousarray(quality, dtype=np.float64)
+        self.state = np.ascontiguousarray(state, dtype=np.float64)
+        self.stateQuality = np.ascontiguousarray(stateQuality, dtype=np.float64)
+        self.stateSizes = np.ascontiguousarray(stateSizes, dtype=np.intc)
+
+        dims = self.solutions.shape[1] if self.solutions.ndim == 2 else 0
+        self.solutions = self.solutions.reshape((len(self.quality), dims))
+        self.state = self.state.reshape((len(self.stateQuality), dims))
+
+    #Converts the "solutions" and "state" fields of the JSON output of the target algorithm 
+    @classmethod
+    def fromResults(cls, results:dict) -> "SolutionArrays":
+        solutions = np.array([x["solution"] for x in results["solutions"]], dtype=np.float64)
+        quality = np.array([x["quality"] for x in results["solutions"]], dtype=np.float64)
+        state = np.array([x["solution"] for st in results["state"] for x in st], dtype=np.float64)
+        stateQuality = np.array([x["quality"] for st in results["state"] for x in st], dtype=np.float64)
+        stateSizes = np.array([len(st) for st in results["state"]], dtype=np.intc)
+        return cls(solutions, quality, state, stateQuality, stateSizes)
+
+    #Reads arrays written by save 
+    @classmethod
+    def load(cls, path:str) -> "SolutionArrays":
+        with np.load(path) as data:
+            return cls(data["solutions"], data["quality"], data["state"], data["stateQuality"], data["stateSizes"])
+
+    #Writes the arrays to path as an uncompressed .npz file 
+    def save(self, path:str) -> None:
+        with open(path, 'wb') as outF:
+            np.savez(outF, solutions=self.solutions, quality=self.quality, state=self.state, stateQuality=self.stateQuality, stateSizes=self.stateSizes)
 
 pth = os.path.abspath(sys.argv[0])
 loc = pth.rfind("/") 
@@ -55,6 +81,19 @@ pth = pth[:loc]
 
 _characterizeLib = cdll.LoadLibrary(f'{pth}/FLA/Characterize.so')
 
+#characterizeFlat reads from and writes to contiguous numpy arrays directly 
+_DOUBLES = np.ctypeslib.ndpointer(dtype=np.float64, flags="C_CONTIGUOUS")
+_INTS = np.ctypeslib.ndpointer(dtype=np.intc, flags="C_CONTIGUOUS")
+_characterizeLib.characterizeFlat.argtypes = [_DOUBLES, _DOUBLES, _DOUBLES, _DOUBLES, c_int, _INTS, c_int, c_int, _DOUBLES, _DOUBLES, _DOUBLES, _DOUBLES, _DOUBLES, c_long]
+_characterizeLib.characterizeFlat.restype = None
+
+_DOUBLEPOINTERS = POINTER(POINTER(c_double))
+_characterizeLib.characterizeMany.argtypes = [c_int, _DOUBLEPOINTERS, _DOUBLEPOINTERS, _DOUBLEPOINTERS, _DOUBLEPOINTERS, _INTS, POINTER(POINTER(c_int)), _INTS, _INTS, _DOUBLEPOINTERS, _DOUBLEPOINTERS, _DOUBLEPOINTERS, _DOUBLEPOINTERS, _DOUBLEPOINTERS, POINTER(c_long), c_int]
+_characterizeLib.characterizeMany.restype = None
+
+#The number of features written to the fixed array by characterizeFlat
+_NUMFIXED = 69
+
 
 
 #If fixedDimensionality, then some features will be calculated on a per dimension basis 
@@ -71,96 +110,128 @@ class Characterizer:
         else:
             return 84
 
-    #Result should contain the following 
+    #Results should be a SolutionArrays, or a dict containing the following 
     #A field "solutions" which is a list of dicts representing the solution generated by each iteration of the algorithm. These dicts contain fields "quality" and "solution" 
     #A field "state" which is a list of lists of dicts representing the considered potential solutions from each iteration. These dicts also contain fields "quality" and "state"
-    def characterize(self, results:dict, seed:int) -> np.ndarray:
-
+    def characterize(self, results:Union[dict,SolutionArrays], seed:int) -> np.ndarray:
 
+        if not isinstance(results, SolutionArrays):
+            results = SolutionArrays.fromResults(results)
 
-        #We need to construct the args for the c function
-        
-        numSolutions = len(results["solutions"])
+        numSolutions = len(results.quality)
         if numSolutions <= 0:
             return np.array([]) 
 
-        dims = len(results["solutions"][0]["solution"]) 
+        dims = results.solutions.shape[1]
+        numStates = len(results.stateSizes)
+
+        if numStates != numSolutions:
+            print("The number of states received by characterizer does not match the number of solution. Are you sure this is what you want?", file=sys.stderr)
 
-        seed = c_long(seed) 
+        out = np.zeros(self._featureSize(dims))
 
-        SOLUTION = POINTER(c_double)
+        #The library writes its results directly into these arrays, the fixed size features go straight into the start of the feature vector
+        fixed = out[:_NUMFIXED]
+        diversity = np.zeros(numSolutions)
+        gBestStep = np.zeros(numSolutions)
+        gBestStag = np.zeros(2*dims)
+        gBestyDist = np.zeros(2*dims)
 
-        solutions = (SOLUTION*numSolutions)() 
-        quality = (c_double*numSolutions)()
+        try:
+            _characterizeLib.characterizeFlat(results.solutions, results.quality, results.state, results.stateQuality, numSolutions, results.stateSizes, numStates, dims, fixed, diversity, gBestStep, gBestStag, gBestyDist, seed)
 
-        for i,sol in enumerate(results["solutions"]):
-            solutions[i] =  SOLUTION() 
-            solutions[i] = (c_double*dims)(*sol["solution"])
-            quality[i] = sol["quality"] 
-        
-        numStates = len(results["state"])
-        state = (POINTER(SOLUTION)*numStates)()
-        stateQuality = ((POINTER(c_double))*numStates)()
-        stateSizes = (c_int*numStates)()
-
-        for i,st in enumerate(results["state"]):
-            state[i] = (SOLUTION*len(st))()
-            stateQuality[i] = (c_double*len(st))()
-            stateSizes[i] = len(st)
-            for j in range(len(st)):
-                state[i][j] = (c_double*dims)(*st[j]["solution"]) 
-                stateQuality[i][j] = st[j]["quality"] 
+            self._completeFeatures(out, results, diversity, gBestStep, gBestStag, gBestyDist, fitMany(self._roCSeries(results, diversity, gBestStep)))
 
-        if numStates != numSolutions:
+            return out
+
+        except Exception as e :
+            print(e)
+            raise CharacterizerError("An error occurred during characterization")
+
+    #Characterizes each of results, using the corresponding seed from seeds, and returns the feature vectors as the rows of a matrix
+    #The whole batch is characterized in a single call to the FLA library, which releases the GIL and splits the work between the given number of native threads (by default one per cpu)
+    #Results with no solutions produce a row of NaNs 
+    def characterizeMany(self, results:List[Union[dict,SolutionArrays]], seeds:List[int], threads:int=None) -> np.ndarray:
+
+        if len(results) != len(seeds):
+            raise CharacterizerError("characterizeMany requires one seed for each result")
+
+        if threads is None:
+            threads = os.cpu_count() 
+
+        results = [x if isinstance(x, SolutionArrays) else SolutionArrays.fromResults(x) for x in results]
+        numResults = len(results)
+
+        numSolutions = np.array([len(x.quality) for x in results], dtype=np.intc)
+        numStates = np.array([len(x.stateSizes) for x in results], dtype=np.intc)
+        dims = np.array([x.solutions.shape[1] for x in results], dtype=np.intc)
+
+        sizes = set([self._featureSize(d) for d,n in zip(dims, numSolutions) if n > 0])
+        if len(sizes) > 1:
+            raise CharacterizerError("All results passed to characterizeMany must produce feature vectors of the same size")
+        size = sizes.pop() if len(sizes) > 0 else self._featureSize(self.dimensionality if self.dimensionality is not None else 0)
+
+        if np.any((numStates != numSolutions) & (numSolutions > 0)):
             print("The number of states received by characterizer does not match the number of solution. Are you sure this is what you want?", file=sys.stderr)
 
-        characteristics = Characteristics()
-        characteristics.diversity = (c_double*numSolutions)() 
-        characteristics.gBestStep = (c_double*(numSolutions-1))()
-        characteristics.gBestStag = (c_double*(dims*2))()
-        characteristics.gBestyDist = (c_double*(dims*2))()
+        out = np.full((numResults, size), np.nan)
+
+        #As in characterize, the library writes to these arrays directly
+        fixed = [out[i,:_NUMFIXED] for i in range(numResults)]
+        diversity = [np.zeros(n) for n in numSolutions]
+        gBestStep = [np.zeros(n) for n in numSolutions]
+        gBestStag = [np.zeros(2*d) for d in dims]
+        gBestyDist = [np.zeros(2*d) for d in dims]
+
+        def pointers(arrays:list, ctype=c_double):
+            return (POINTER(ctype)*numResults)(*[x.ctypes.data_as(POINTER(ctype)) for x in arrays])
 
         try:
-            _characterizeLib.characterize(solutions, quality, state, stateQuality, numSolutions, stateSizes, dims, byref(characteristics), seed)
-
-            # print(characteristics.FDC)
-            # print([x for x in characteristics.yDist])
-            # print([x for x in characteristics.pairwise])
-            # print(characteristics.FEM)
-            # print([x for x in characteristics.grad])
-            # print([x for x in characteristics.M])
-            # print([x for x in characteristics.stag])
-            # print([characteristics.diversity[x] for x in range(numSolutions)])
-            # print([characteristics.gBestStep[x] for x in range(numSolutions)])
-            # print([characteristics.gBestStag[x] for x in range(2*dims)])
-            # print([characteristics.gBestyDist[x] for x in range(2*dims)])
-            
-            #Construct a feature vector with the results 
-            out =   [[characteristics.FDC] +
-                    [x for x in characteristics.yDist] + 
-                    [x for x in characteristics.pairwise] + 
-                    [characteristics.FEM] +
-                    [x for x in characteristics.grad] +
-                    [x for x in characteristics.M] + 
-                    [x for x in characteristics.stag] +
-                    [characteristics.diversity[numSolutions-1]] + 
-                    fit([characteristics.diversity[x] for x in range(numSolutions)]) + 
-                    [characteristics.gBestStep[numSolutions-2]] + 
-                    fit([characteristics.gBestStep[x] for x in range(numSolutions-1)]) +
-                    [quality[-1]] + 
-                    fit([x for x in quality]) 
-            ]
-            
-            if self.perDimensionFeatures:
-                out[0] += [characteristics.gBestStag[x] for x in range(2*dims)] 
-                out[0] += [characteristics.gBestyDist[x] for x in range(2*dims)]
-
-            out = np.asarray(out[0])
+            _characterizeLib.characterizeMany(numResults, 
+                pointers([x.solutions for x in results]), pointers([x.quality for x in results]), pointers([x.state for x in results]), pointers([x.stateQuality for x in results]), 
+                numSolutions, pointers([x.stateSizes for x in results], c_int), numStates, dims, 
+                pointers(fixed), pointers(diversity), pointers(gBestStep), pointers(gBestStag), pointers(gBestyDist), 
+                (c_long*numResults)(*seeds), threads)
 
-            return out
+            #The RoC features for the whole batch are fit together
+            done = [i for i in range(numResults) if numSolutions[i] > 0]
+            fits = fitMany([x for i in done for x in self._roCSeries(results[i], diversity[i], gBestStep[i])]).reshape((len(done), 3, 4))
+
+            for i,f in zip(done, fits):
+                self._completeFeatures(out[i], results[i], diversity[i], gBestStep[i], gBestStag[i], gBestyDist[i], f)
+
+            return out 
 
         except Exception as e :
             print(e)
             raise CharacterizerError("An error occurred during characterization")
 
+    #The size of the feature vectors produced for results with dims dimensions
+    def _featureSize(self, dims:int) -> int:
+        if self.perDimensionFeatures:
+            return 84 + (4*dims)
+        else:
+            return 84
+
+    #The series which RoC features are computed from 
+    def _roCSeries(self, results:SolutionArrays, diversity:np.ndarray, gBestStep:np.ndarray) -> List[np.ndarray]:
+        return [diversity, gBestStep[:len(results.quality)-1], results.quality]
+
+    #Fills in the features computed from the outputs of the FLA library which follow the fixed size features in out
+    #fits gives the RoC parameters fit to each of the series from _roCSeries
+    def _completeFeatures(self, out:np.ndarray, results:SolutionArrays, diversity:np.ndarray, gBestStep:np.ndarray, gBestStag:np.ndarray, gBestyDist:np.ndarray, fits:np.ndarray) -> None:
+        numSolutions = len(results.quality)
+        dims = results.solutions.shape[1]
+
+        out[_NUMFIXED] = diversity[-1]
+        out[_NUMFIXED + 1:_NUMFIXED + 5] = fits[0]
+        out[_NUMFIXED + 5] = gBestStep[numSolutions-2]
+        out[_NUMFIXED + 6:_NUMFIXED + 10] = fits[1]
+        out[_NUMFIXED + 10] = results.quality[-1]
+        out[_NUMFIXED + 11:_NUMFIXED + 15] = fits[2]
+        
+        if self.perDimensionFeatures:
+            out[84:84 + 2*dims] = gBestStag
+            out[84 + 2*dims:] = gBestyDist
+
 
@@ -19,12 +19,16 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 Stores the collection of configurations that have been tested. Organized by run, which allows us to know the sequence in which configs were used.
 """
-from Configurator.ConfigurationDefinition import Configuration
+from Configurator.ConfigurationDefinition import Configuration, ConfigurationDefinition
+from Configurator.Problem import Instance
 import time
-from typing import Iterator, List, Union
+from typing import Iterator, List, Tuple, Union
 from Configurator.Run import Run
+from functools import partial
+import numpy as np
 import sqlite3
 import pickle
+import json
 from random import Random
 
 """
@@ -64,12 +68,24 @@ class ConfigurationDB:
     def addRun(self, run: Run) -> None:
         raise NotImplementedError
 
+    #Add a batch of runs to the DB
+    def addRuns(self, runs: List[Run]) -> None:
+        raise NotImplementedError
+
     #produces a list of configurations which have been flagged for an additional run
     def getReRuns(self) -> List[Run]:
         raise NotImplementedError
 
-    #produces the current desirbale runs 
-    def getDesirables(self) -> List[Run]:
+    #produces the current desirbale runs, or a random selection of at most limit of them 
+    def getDesirables(self, limit:int=None) -> List[Run]:
+        raise NotImplementedError
+
+    #produces (record id, features, next parameter values) training examples from the runs of every record in ids 
+    def getTrainingData(self, ids:List[int]) -> Tuple[List[int], np.ndarray, List[dict]]:
+        raise NotImplementedError
+
+    #produces a dict summarizing each of the current desirable runs 
+    def getDesirableSummaries(self, limit:int=None) -> List[dict]:
         raise NotImplementedError
 
     #iterate through all records in the database
@@ -84,6 +100,18 @@ class ConfigurationDB:
     def problemGenerator(self) -> Iterator[Iterator[RecordTemplate]]:
         raise NotImplementedError
 
+    #Sets the desirable flag of every record in ids to val 
+    def setDesirable(self, ids:List[int], val:bool) -> None:
+        raise NotImplementedError
+
+    #Sets the rerun flag of every record in ids to val 
+    def setReRun(self, ids:List[int], val:bool) -> None:
+        raise NotImplementedError
+
+    #The total number of function evaluations consumed by runs performed on iteration, or by all runs if iteration is None 
+    def evaluationsConsumed(self, iteration:int=None) -> int:
+        raise NotImplementedError
+
     #Backup this DB to the specified PATH
     def backup(self, path:str) -> None:
         raise NotImplementedError
@@ -97,13 +125,18 @@ A record implementation for accessing records from an sqlite3 backed configurati
 """
 class sqlite3Record(RecordTemplate):
     #id is the primary key of the record 
-    #db is a connection to the underlying db 
+    #configDB is the DB containing the record 
     #problem is the identifier of the problem associated with this record
-    def __init__(self, id:int, problem:int, db:sqlite3.Connection, qualities:List[float]):
+    #desirable, rerun, and modified are the values of the records flags and modified time when it was fetched from the DB 
+    def __init__(self, id:int, problem:int, configDB:"sqlite3ConfigurationDB", qualities:List[float], desirable:bool, rerun:bool, modified:int):
         self._id = id
-        self._db = db
+        self._configDB = configDB
+        self._db = configDB.db
         self._problem = problem
         self._qualities = qualities
+        self._desirable = desirable 
+        self._rerun = rerun 
+        self._modified = modified 
 
     def problem(self) -> int:
         return self._problem 
@@ -113,75 +146,40 @@ class sqlite3Record(RecordTemplate):
 
     #add a run to the record
     def addRun(self, run: Run) -> None:
-        cur = self._db.cursor()
-        runBlob = pickle.dumps(run)
-        cur.execute("  INSERT INTO runs        (run, record) \
-                            VALUES                  ({},{},{})".format(runBlob, self._id))
-
-        cur.execute("  UPDATE records \
-                            SET modified = {} \
-                            WHERE id = {}".format(int(time.time()*1000000), self._id))
-        self._db.commit()
+        self._configDB._addRuns([run], [self._id])
         self._qualities.append(run.quality())
 
     #list the runs associated with the record
     def getRuns(self) -> List[Run]:
-        cur = self._db.cursor() 
-        cur.execute("   SELECT run \
-                        FROM runs \
-                        WHERE record = {}".format(self._id))
-
-        return [pickle.loads(row[0]) for row in cur]
+        return self._configDB._loadRuns("runs.record = ?", (self._id,))
 
     #check or set this records rerun flag
+    #To set the flag for many records at once, see sqlite3ConfigurationDB.setReRun
     def reRun(self, val:bool=None) -> Union[None, bool]:
-        cur = self._db.cursor()
         if val is None:
-            cur.execute("   SELECT rerun \
-                            FROM records \
-                            WHERE id = {}".format(self._id)) 
-            return cur.fetchone()[0] != 0
+            return self._rerun 
         else:
-            if val:
-                rerun = 1 
-            else:
-                rerun = 0
-            cur.execute("   UPDATE records \
-                            SET modified = {}, rerun = {} \
-                            WHERE id = {}".format(int(time.time()*1000000), rerun, self._id))
-            self._db.commit()
+            self._modified = self._configDB.setReRun([self._id], val)
+            self._rerun = val 
 
     #check or set this records desirable flag
+    #To set the flag for many records at once, see sqlite3ConfigurationDB.setDesirable
     def desirable(self, val:bool=None) ->  Union[None, bool]:
-        cur = self._db.cursor()
         if val is None:
-            cur.execute("   SELECT desirable \
-                            FROM records \
-                            WHERE id = {}".format(self._id)) 
-            return cur.fetchone()[0] != 0 
+            return self._desirable 
         else:
-            if val:
-                desirable = 1 
-            else:
-                desirable = 0
-            cur.execute("   UPDATE records \
-                            SET modified = {}, desirable = {} \
-                            WHERE id = {}".format(int(time.time()*1000000), desirable, self._id))
-            self._db.commit()
+            self._modified = self._configDB.setDesirable([self._id], val)
+            self._desirable = val 
 
     #retrieve the modified time of this record 
     def updatedAt(self) -> int:
-        cur = self._db.cursor()
-        cur.execute("   SELECT modified \
-                        FROM records \
-                        WHERE id = {}".format(self._id))
-        return cur.fetchone()[0]
+        return self._modified 
         
     def qualities(self) -> List[float]:
         return self._qualities
         
 
-#TODO: we need a names table, to map problem integers to problem flags. It's more convienient, and protects stored results against changes in python's hash function
+#TODO: we need a names table, to map problem integers to problem flags. It's more convienient than recovering the flags from the runs
 #also need to update record and db methods to keep the names table up to date
 """
 A configuration DB backed by sqlite 3.
@@ -189,15 +187,25 @@ A configuration DB backed by sqlite 3.
 class sqlite3ConfigurationDB(ConfigurationDB):
     
     #Connect to the DB found at path. If initialize is true, a fresh DB will be initialized.
-    def __init__(self, path:str=":memory:", initialize:bool=False, seed:int=None):
+    #DBs stored on disk use write ahead logging, so several processes (ie a Runner's workers) can write to the DB while others read from it. timeout gives the number of seconds to wait for another process to finish writing
+    def __init__(self, path:str=":memory:", initialize:bool=False, seed:int=None, timeout:float=60):
         self.rng = Random(seed)
-        self.db = sqlite3.connect(path)
+        self.path = path 
+        self.db = sqlite3.connect(path, timeout=timeout)
         cur = self.db.cursor()
+
+        if path != ":memory:":
+            cur.execute("PRAGMA journal_mode=WAL")
         
+        #The definition used to reconstruct stored configurations, see _configurationDefinition
+        self._configDef = None 
+
         #Attempt to drop any tables that already exist and re-initialize them 
         if initialize:
+            cur.execute("DROP TABLE IF EXISTS configurations")
             cur.execute("DROP TABLE IF EXISTS runs")
             cur.execute("DROP TABLE IF EXISTS records") 
+            cur.execute("DROP TABLE IF EXISTS meta") 
 
             cur.execute("CREATE TABLE records ( \
                 id          INTEGER PRIMARY KEY, \
@@ -208,115 +216,311 @@ class sqlite3ConfigurationDB(ConfigurationDB):
                 modified    INTEGER NOT NULL \
             )")
 
+            #problemFlags and instanceFlags give the instance the run was performed on
             cur.execute("CREATE TABLE runs ( \
-                run     BLOB NOT NULL, \
-                record  INTEGER NOT NULL, \
-                quality REAL NOT NULL, \
+                id              INTEGER PRIMARY KEY, \
+                record          INTEGER NOT NULL, \
+                quality         REAL NOT NULL, \
+                problemFlags    TEXT NOT NULL, \
+                instanceFlags   TEXT NOT NULL, \
+                performedAt     INTEGER NOT NULL, \
+                iteration       INTEGER, \
                 FOREIGN KEY(record) REFERENCES records(id) \
             )")
 
+            #One row for each configuration used in a run, step gives the position of the configuration in the run 
+            #configuration is a JSON object giving the parameter values, features are stored as packed float64s, and rawResult is pickled 
+            cur.execute("CREATE TABLE configurations ( \
+                run                 INTEGER NOT NULL, \
+                step                INTEGER NOT NULL, \
+                configuration       TEXT NOT NULL, \
+                quality             REAL, \
+                evaluationsConsumed INTEGER, \
+                generationMethod    TEXT, \
+                seed                INTEGER, \
+                characterizeSeed    INTEGER, \
+                threadID            INTEGER, \
+                valid               INTEGER NOT NULL, \
+                ignoreConstraints   INTEGER NOT NULL, \
+                features            BLOB, \
+                rawResult           BLOB, \
+                PRIMARY KEY(run, step), \
+                FOREIGN KEY(run) REFERENCES runs(id) \
+            )")
+
+            #records are looked up by config and problem on every insert, runs are joined to records, and the evaluator filters on modified and desirable 
+            cur.execute("CREATE INDEX recordsConfigProblem ON records (config, problem)")
+            cur.execute("CREATE INDEX recordsModified ON records (modified)")
+            cur.execute("CREATE INDEX recordsDesirable ON records (desirable)")
+            cur.execute("CREATE INDEX runsRecord ON runs (record)")
+
+            #Holds the pickled ConfigurationDefinition shared by all stored configurations
+            cur.execute("CREATE TABLE meta ( \
+                key     TEXT PRIMARY KEY, \
+                value   BLOB NOT NULL \
+            )")
+
             self.db.commit()
 
     #Add a run to the DB
     def addRun(self, run: Run) -> None:
+        self.addRuns([run])
+
+    #Add a batch of runs to the DB, in a single transaction
+    def addRuns(self, runs: List[Run]) -> None:
+        self._addRuns(runs, None)
+
+    #Adds runs to the DB, rcrdIDs gives the record of each run, or None to find (or create) the record matching each run's initial config and problem 
+    def _addRuns(self, runs:List[Run], rcrdIDs:List[int]) -> None:
+        if len(runs) == 0:
+            return 
 
-        #TODO: probably need to do this -> stop pickling the entire run, its a waste of time
-        #expand the runs table to store more info directly, pickle the alg output json, have run objects lazy load the alg data
         cur = self.db.cursor()
 
-        config = run.runConfigID() 
-        problem = run.problem()
-        
-        #Check for an exists record, and create if none
-        cur.execute("SELECT id FROM records WHERE config = {} AND problem = {}".format(config,problem)) 
-        result = cur.fetchone()
-        if result is None:
-            cur.execute(   "   INSERT INTO records    (config, problem, desirable, rerun, modified)\
-                                    VALUES                  ({},{},{},{},{})".format(config, problem, 0, 0, int(time.time()*1000000)))
+        #take the write lock up front, so the ids allocated below can't be taken by another connection 
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            #the modified time is taken once the lock is held, so rows are always committed in the order of their modified times, which getNew relies on 
+            modified = int(time.time()*1000000)
+            if rcrdIDs is None:
+                rcrdIDs = self._recordIDs(cur, [(run.runConfigID(), run.problem()) for run in runs], modified)
+
+            self._insertRuns(cur, runs, rcrdIDs)
+
+            cur.executemany("  UPDATE records \
+                                SET modified = ? \
+                                WHERE id = ?", [(modified, x) for x in sorted(set(rcrdIDs))])
             self.db.commit()
-            cur.execute("SELECT id FROM records WHERE config = {} AND problem = {}".format(config,problem))
+        except:
+            self.db.rollback()
+            raise 
+
+    #Finds the record for each (config, problem) pair in keys, creating any that are missing. Must be called within a transaction 
+    def _recordIDs(self, cur:sqlite3.Cursor, keys:List[tuple], modified:int) -> List[int]:
+        ids = dict()
+        missing = []
+        for key in dict.fromkeys(keys):
+            cur.execute("SELECT id FROM records WHERE config = ? AND problem = ?", key) 
             result = cur.fetchone()
+            if result is None:
+                missing.append(key)
+            else:
+                ids[key] = result[0]
+
+        if len(missing) > 0:
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM records")
+            nextID = cur.fetchone()[0] + 1
+            for i,key in enumerate(missing):
+                ids[key] = nextID + i 
+
+            cur.executemany(   "   INSERT INTO records    (id, config, problem, desirable, rerun, modified)\
+                                        VALUES                  (?,?,?,?,?,?)", [(ids[key], key[0], key[1], 0, 0, modified) for key in missing])
+
+        return [ids[key] for key in keys]
+
+    #Inserts runs, and each of their configurations, with the corresponding records from rcrdIDs. Must be called within a transaction 
+    def _insertRuns(self, cur:sqlite3.Cursor, runs:List[Run], rcrdIDs:List[int]) -> None:
+        if self._configDef is None:
+            self._configDef = runs[0].configurations[0].configurationDefinition
+            cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?,?)", ("configurationDefinition", pickle.dumps(self._configDef)))
+
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM runs")
+        nextID = cur.fetchone()[0] + 1
+
+        runRows = []
+        confRows = []
+        for runID,(run,rcrdID) in enumerate(zip(runs, rcrdIDs), nextID):
+            runRows.append((runID, rcrdID, run.quality(), run.instance.problem, run.instance.flags, run.performedAt, run.performedOnIteration))
+
+            for step,conf in enumerate(run.configurations):
+                rawResult = conf.rawResult
+                evaluationsConsumed = rawResult.get("evaluationsConsumed") if rawResult is not None else None
+                features = np.asarray(conf.features, dtype=np.float64).tobytes() if conf.features is not None else None
+                confRows.append((runID, step, json.dumps(conf.toDict()), conf.quality, evaluationsConsumed, conf.generationMethod, conf.seed, conf.characterizeSeed, conf.threadID, int(conf.valid), int(conf._ignoreConstraints), features, pickle.dumps(rawResult)))
+
+        cur.executemany("  INSERT INTO runs        (id, record, quality, problemFlags, instanceFlags, performedAt, iteration) \
+                                VALUES                  (?,?,?,?,?,?,?)", runRows)
+
+        cur.executemany("  INSERT INTO configurations  (run, step, configuration, quality, evaluationsConsumed, generationMethod, seed, characterizeSeed, threadID, valid, ignoreConstraints, features, rawResult) \
+                                VALUES                      (?,?,?,?,?,?,?,?,?,?,?,?,?)", confRows)
+
+    #The ConfigurationDefinition of the stored configurations 
+    def _configurationDefinition(self) -> ConfigurationDefinition:
+        if self._configDef is None:
+            cur = self.db.cursor()
+            cur.execute("SELECT value FROM meta WHERE key = ?", ("configurationDefinition",))
+            self._configDef = pickle.loads(cur.fetchone()[0])
+        return self._configDef
+
+    #Reconstructs a configuration from its stored parameter values 
+    def _buildConfiguration(self, values:str, valid:int, ignoreConstraints:int) -> Configuration:
+        conf = Configuration(self._configurationDefinition(), json.loads(values))
+        if ignoreConstraints != 0:
+            conf._ignoreConstraints = True 
+        conf.valid = valid != 0
+        return conf
+
+    #Loads the rawResult of the configuration used in step of the run runID
+    def _loadRawResult(self, runID:int, step:int) -> dict:
+        cur = self.db.cursor()
+        cur.execute("SELECT rawResult FROM configurations WHERE run = ? AND step = ?", (runID, step))
+        return pickle.loads(cur.fetchone()[0])
 
-        rcrdID = result[0]
-        
-
-        runBlob = pickle.dumps(run)
+    #Loads the runs matching condition, a WHERE clause over the runs table with bound parameters params 
+    #Runs are returned in the order they were added 
+    def _loadRuns(self, condition:str, params:tuple=()) -> List[Run]:
+        cur = self.db.cursor()
+        cur.execute(f"  SELECT  runs.id, runs.problemFlags, runs.instanceFlags, runs.performedAt, runs.iteration, \
+                                c.step, c.configuration, c.quality, c.generationMethod, c.seed, c.characterizeSeed, c.threadID, c.valid, c.ignoreConstraints, c.features \
+                        FROM    runs INNER JOIN configurations AS c ON c.run = runs.id \
+                        WHERE   {condition} \
+                        ORDER BY runs.id, c.step", params)
 
-        cur.execute("  INSERT INTO runs        (run, record, quality) \
-                            VALUES                  (?,?,?)", (runBlob, rcrdID,run.quality()))
+        ret = []
+        prev = None 
+        for runID, problemFlags, instanceFlags, performedAt, iteration, step, values, quality, generationMethod, seed, characterizeSeed, threadID, valid, ignoreConstraints, features in cur:
+            if runID != prev:
+                prev = runID 
+                run = Run(Instance.fromFlags(problemFlags, instanceFlags))
+                run.performedAt = performedAt 
+                run.performedOnIteration = iteration 
+                ret.append(run)
+
+            conf = self._buildConfiguration(values, valid, ignoreConstraints)
+            conf.quality = quality 
+            conf.generationMethod = generationMethod 
+            conf.seed = seed 
+            conf.characterizeSeed = characterizeSeed 
+            conf.threadID = threadID 
+            conf.features = np.frombuffer(features, dtype=np.float64).copy() if features is not None else None
+            conf.lazyRawResult(partial(self._loadRawResult, runID, step))
+            run.configurations.append(conf)
 
-        cur.execute("  UPDATE records \
-                            SET modified = {} \
-                            WHERE id = {}".format(int(time.time()*1000000), rcrdID))
-        self.db.commit()
+        return ret 
 
     #produces a list of configurations which have been flagged for an additional run
     def getReRuns(self) -> List[Configuration]:
         cur = self.db.cursor()
 
-        #grab an example run from each record flagged for rerun
-        cur.execute("   SELECT run, record \
+        #grab the initial configuration of an example run from each record flagged for rerun
+        cur.execute("   SELECT configuration, valid, ignoreConstraints \
                         FROM    runs    INNER JOIN      (SELECT id \
                                                         FROM records \
                                                         WHERE rerun != 0) as RCRDS \
                                         ON runs.record = RCRDS.id  \
+                                        INNER JOIN configurations ON configurations.run = runs.id \
+                        WHERE step = 0 \
                         GROUP BY record ")
 
-        ret = []
-        #duplicate the initial config, and return
-        for row in cur:
-            run = pickle.loads(row[0])
-            newConf = run.configurations[0].duplicateParams() 
-            ret.append(newConf) 
-        
-        return ret
+        #a fresh copy of the params, as produced by duplicateParams
+        return [self._buildConfiguration(values, valid, ignoreConstraints) for values, valid, ignoreConstraints in cur]
         
     #produces the current desirable runs 
     #limit gives the max number of results which should be returned. If there are more than limit results available, a random selection will be returned 
     def getDesirables(self, limit:int=None) -> List[Run]:
-        cur = self.db.cursor()
+        return self._loadRuns(*self._sampleDesirables(limit))
 
-        
-        cur.execute("SELECT id \
-                    FROM records \
-                    WHERE desirable != 0") 
-
-        ids = [row[0] for row in cur] 
+    #Selects the runs of up to limit desirable records, chosen at random with the DB's rng, or of every desirable record if limit is None 
+    #Returns a WHERE clause over the runs table and its bound parameters 
+    #The sample is drawn by position among the desirable records, so only the count of desirable records is read into python, and the positions are bound as a json list so no temporary table needs to be written 
+    def _sampleDesirables(self, limit:int=None) -> Tuple[str, tuple]:
+        if limit is None:
+            return "runs.record IN (SELECT id FROM records WHERE desirable != 0)", ()
 
-        if limit is not None:
-            #prevent too large of sample
-            if limit > len(ids):
-                limit = len(ids)
-            ids = self.rng.sample(ids, limit)
+        cur = self.db.cursor()
+        cur.execute("SELECT COUNT(*) FROM records WHERE desirable != 0")
+        count = cur.fetchone()[0]
+
+        #prevent too large of sample
+        if limit > count:
+            limit = count 
+        ordinals = self.rng.sample(range(count), limit)
+
+        if len(ordinals) == 0:
+            return "0", ()
+
+        return "runs.record IN (SELECT id \
+                                FROM    (SELECT id, ROW_NUMBER() OVER (ORDER BY id) - 1 AS ordinal \
+                                        FROM records \
+                                        WHERE desirable != 0) AS DESIRABLES \
+                                WHERE ordinal IN (SELECT value FROM json_each(?)))", (json.dumps(ordinals),)
+
+    #produces training examples from the runs of every record in ids, without building the runs 
+    #Each example pairs the features observed after a step of a run with the parameter values of the configuration used in the next step 
+    #Returns the id of the record each example came from, a matrix of features with one row per example, and a list of the corresponding parameter values. Examples are grouped by record 
+    def getTrainingData(self, ids:List[int]) -> Tuple[List[int], np.ndarray, List[dict]]:
+        if len(ids) == 0:
+            return [], np.empty((0,0), dtype=np.float64), []
+        return self._trainingData("runs.record IN (SELECT value FROM json_each(?))", (json.dumps(ids),))
+
+    #Loads the training examples of the runs matching condition, a WHERE clause over the runs table with bound parameters params 
+    def _trainingData(self, condition:str, params:tuple) -> Tuple[List[int], np.ndarray, List[dict]]:
+        cur = self.db.cursor()
+        cur.execute(f"  SELECT  runs.record, c.features, n.configuration \
+                        FROM    runs    INNER JOIN configurations AS c ON c.run = runs.id \
+                                        INNER JOIN configurations AS n ON n.run = runs.id AND n.step = c.step + 1 \
+                        WHERE   {condition} AND c.features IS NOT NULL \
+                        ORDER BY runs.record, runs.id, c.step", params)
+
+        recordIDs = [] 
+        features = [] 
+        targets = [] 
+        for recordID, feature, values in cur:
+            recordIDs.append(recordID)
+            features.append(feature)
+            targets.append(json.loads(values))
+
+        if len(features) == 0:
+            return recordIDs, np.empty((0,0), dtype=np.float64), targets
+
+        return recordIDs, np.frombuffer(b"".join(features), dtype=np.float64).reshape(len(features), -1), targets
+
+    #produces a summary of each of the current desirable runs, without building the runs 
+    #Each summary is a dict with the problem, the quality of the run, the parameter values of its initial configuration, and the number of configurations produced by each generationMethod
+    #limit is as for getDesirables 
+    def getDesirableSummaries(self, limit:int=None) -> List[dict]:
+        condition, params = self._sampleDesirables(limit)
 
-        idList = "(" + ",".join([str(x) for x in ids]) + ")"
+        cur = self.db.cursor()
+        cur.execute(f"  SELECT  runs.id, runs.problemFlags, runs.quality, first.configuration, c.generationMethod, COUNT(*) \
+                        FROM    runs    INNER JOIN configurations AS first ON first.run = runs.id AND first.step = 0 \
+                                        INNER JOIN configurations AS c ON c.run = runs.id \
+                        WHERE   {condition} \
+                        GROUP BY runs.id, c.generationMethod \
+                        ORDER BY runs.id", params)
 
-        cur.execute(f"   SELECT  run \
-                        FROM    runs \
-                        WHERE record IN {idList}")
-                        
         ret = [] 
-        for row in cur:
-            run = pickle.loads(row[0]) 
-            ret.append(run)
+        prev = None 
+        for runID, problem, quality, values, generationMethod, count in cur:
+            if runID != prev:
+                prev = runID 
+                summary = {"problem":problem, "quality":quality, "initialConfiguration":json.loads(values), "generationMethods":dict()}
+                ret.append(summary)
+            summary["generationMethods"][generationMethod] = count 
+
         return ret 
 
     def _generateRecordsForProblem(self, problem) -> Iterator[RecordTemplate]:
+        return self._records("problem = ?", (problem,))
+
+    #Generates the records matching condition, a WHERE clause over the records table with bound parameters params 
+    def _records(self, condition:str, params:tuple) -> Iterator[RecordTemplate]:
         cur = self.db.cursor()
-        cur.execute("   SELECT records.id, records.problem, quality \
+        cur.execute(f"  SELECT records.id, records.problem, records.desirable, records.rerun, records.modified, quality \
                         FROM records INNER JOIN runs on records.id = runs.record \
-                        WHERE problem = {} \
-                        ORDER BY records.id".format(problem))
+                        WHERE {condition} \
+                        ORDER BY records.id", params)
         prev = None
         qualities = [] 
-        for id, problem, quality in cur:
+        for id, problem, desirable, rerun, modified, quality in cur:
             if prev is not None and id != prev[0]:
-                yield sqlite3Record(prev[0], prev[1], self.db, qualities) 
+                yield sqlite3Record(prev[0], prev[1], self, qualities, prev[2] != 0, prev[3] != 0, prev[4]) 
                 qualities = [] 
-            prev = (id, problem)
+            prev = (id, problem, desirable, rerun, modified)
             qualities.append(quality)
 
-        yield sqlite3Record(prev[0], prev[1], self.db, qualities)
+        if prev is not None:
+            yield sqlite3Record(prev[0], prev[1], self, qualities, prev[2] != 0, prev[3] != 0, prev[4])
 
     #returns a generator of generators, each generating all records for a specifc problem 
     def problemGenerator(self) -> Iterator[Iterator[RecordTemplate]]:
@@ -335,22 +539,45 @@ class sqlite3ConfigurationDB(ConfigurationDB):
 
     #returns any records as new as or newer than time 
     def getNew(self, time) -> Iterator[RecordTemplate]:
-        cur = self.db.cursor() 
-        cur.execute("   SELECT records.id,records.problem,quality \
-                        FROM records INNER JOIN runs on records.id = runs.record\
-                        WHERE modified >= {} \
-                        ORDER BY records.id".format(time))
-        prev = None 
-        qualities = []
-        for id, problem, quality in cur:
-            if prev is not None and id != prev[0]:
-                yield sqlite3Record(prev[0], prev[1], self.db, qualities) 
-                qualities = [] 
-            prev = (id, problem) 
-            qualities.append(quality)
+        return self._records("modified >= ?", (time,))
+
+    #Sets the desirable flag of every record in ids to val, in a single transaction. Returns the new modified time of the records
+    def setDesirable(self, ids:List[int], val:bool) -> int:
+        return self._setFlag("desirable", ids, val)
+
+    #Sets the rerun flag of every record in ids to val, in a single transaction. Returns the new modified time of the records
+    def setReRun(self, ids:List[int], val:bool) -> int:
+        return self._setFlag("rerun", ids, val)
+
+    #flag must be the name of one of the flag columns of records 
+    def _setFlag(self, flag:str, ids:List[int], val:bool) -> int:
+        cur = self.db.cursor()
+
+        #as in _addRuns, the modified time is taken once the write lock is held 
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            modified = int(time.time()*1000000)
+            cur.executemany(f"  UPDATE records \
+                                SET modified = ?, {flag} = ? \
+                                WHERE id = ?", [(modified, 1 if val else 0, x) for x in ids])
+            self.db.commit()
+        except:
+            self.db.rollback()
+            raise
+        return modified 
+
+    #The total number of function evaluations consumed by runs performed on iteration, or by all runs if iteration is None 
+    def evaluationsConsumed(self, iteration:int=None) -> int:
+        cur = self.db.cursor()
+        if iteration is None:
+            cur.execute("SELECT SUM(evaluationsConsumed) FROM configurations")
+        else:
+            cur.execute("   SELECT SUM(evaluationsConsumed) \
+                            FROM configurations INNER JOIN runs ON configurations.run = runs.id \
+                            WHERE runs.iteration = ?", (iteration,))
+        total = cur.fetchone()[0]
+        return total if total is not None else 0
 
-        yield sqlite3Record(prev[0], prev[1], self.db, qualities)
-        
     #Backup this DB to the specified PATH
     def backup(self, path:str) -> None:
         def progress(status, remaining, total):
@@ -16,6 +16,17 @@ You should have received a copy of the GNU Lesser General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import ast
+import math
+import operator as op
+import re
+from array import array
+from collections.abc import Mapping
+from functools import reduce
+from typing import Callable, Dict, Iterator, List
+import numpy as np
+from numpy import ndarray
+
 """
 Parses and represents the user provided definition of valid configurations. 
 """
@@ -37,63 +48,187 @@ class ConfigurationDefinition:
             else:
                 raise ValueError("Invalid parameter type: {0}".format(param["type"]))
 
+        #the position of each parameter in parameters, Configurations store their values in this order 
+        self.index = {param.name:i for i,param in enumerate(self.parameters)}
+
         #A list of constraints 
         self.constraints = [] 
         for constraint in definitions["constraints"]:
             self.constraints.append(Constraint(constraint))
 
+        for constraint in self.constraints:
+            for name in constraint.parameters:
+                if name not in self.index:
+                    raise ValueError("ValueError: The constraint {0} refers to an unknown parameter: {1}".format(constraint.expression, name))
+
+    #Definitions pickled before the index existed, ex inside older model states, rebuild it when unpickled 
+    def __setstate__(self, state:dict) -> None:
+        self.__dict__.update(state)
+        if "index" not in state:
+            self.index = {param.name:i for i,param in enumerate(self.parameters)}
+
     def validate(self, configuration:"Configuration") -> bool:
         for constraint in self.constraints:
             if not constraint.test(configuration):
                 return False 
         return True 
 
+    #Validates many candidate configurations at once, columns maps each parameter name to an array with one value per candidate (see columns)
+    #returns a boolean array which is True for each candidate meeting every constraint 
+    def validateBatch(self, columns:Dict[str, ndarray]) -> ndarray:
+        n = len(next(iter(columns.values()))) if len(columns) > 0 else 0
+        valid = np.ones(n, dtype=bool)
+        for constraint in self.constraints:
+            valid &= constraint.testBatch(columns, n)
+        return valid 
+
+    #Converts a list of parameter value dicts into one array per parameter, as accepted by validateBatch
+    def columns(self, values:List[dict]) -> Dict[str, ndarray]:
+        ret = dict() 
+        for param in self.parameters:
+            if param.type == "categorical":
+                ret[param.name] = np.asarray([x[param.name] for x in values], dtype=object)
+            else:
+                ret[param.name] = np.asarray([x[param.name] for x in values], dtype=np.float64)
+        return ret 
+
 
-import ast
-import operator as op
-from typing import List
 """
 Defines a constrain from an arithmetic expression 
+The expression is parsed once, into a tree of closures over the parameter values, which can be evaluated for a single configuration or for NumPy arrays of candidates
 """
 class Constraint:
+    operators = {ast.Add: op.add, ast.Sub: op.sub, ast.Mult: op.mul,
+        ast.Div: op.truediv, ast.Lt: op.lt, ast.Gt:op.gt, ast.LtE:op.le, 
+        ast.GtE:op.ge, ast.Eq:op.eq, ast.NotEq:op.ne, ast.And:op.and_, ast.Or:op.or_,
+        ast.BitAnd:op.and_, ast.BitOr:op.or_, ast.USub:op.neg, ast.UAdd:op.pos, ast.Pow:op.pow}
+
+    #$name is replaced by a python name with this prefix, so each parameter becomes a variable of the expression 
+    prefix = "__p_"
     
     def __init__(self, expression: str):
         self.expression = expression 
-        self.operators = {ast.Add: op.add, ast.Sub: op.sub, ast.Mult: op.mul,
-            ast.Div: op.truediv, ast.Lt: op.lt, ast.Gt:op.gt, ast.LtE:op.le, 
-            ast.GtE:op.ge, ast.Eq:op.eq, ast.NotEq:op.ne, ast.And:op.and_, ast.Or:op.or_,
-            ast.USub:op.neg, ast.Pow:op.pow}
 
+        #the names of the parameters referred to by the expression 
+        self.parameters = [] 
+        for name in re.findall(r"\$(\w+)", expression):
+            if name not in self.parameters:
+                self.parameters.append(name)
+
+        try:
+            tree = ast.parse(re.sub(r"\$(\w+)", self.prefix + r"\1", expression), mode='eval')
+        except SyntaxError as e:
+            raise ValueError("ValueError: Invalid constraint {0}".format(expression)) from e
+
+        self._evaluate = self.__compile(tree.body)
+
+    #The compiled expression can't be pickled, so only the expression is kept and it is compiled again when unpickled 
+    def __getstate__(self) -> dict:
+        return {"expression":self.expression}
+
+    def __setstate__(self, state:dict) -> None:
+        self.__init__(state["expression"])
+
+    #A configuration fails the constraint if evaluating it divides by zero, overflows, or produces a non-finite or complex value 
     def test(self, config:"Configuration") -> bool:
-        expr = self.expression 
-        for k in config.values:
-            expr = expr.replace("${0}".format(k), str(config.values[k].value)) 
+        return self._test({name:_constraintValue(config[name]) for name in self.parameters})
 
-        result = self.__eval(ast.parse(expr, mode='eval').body)
+    def _test(self, values:dict) -> bool:
+        try:
+            result = self._evaluate(values)
+        except ArithmeticError:
+            return False 
 
         if not isinstance(result, bool):
             raise ValueError("Constrains should evaluate to True or False") 
 
         return result 
 
-    #return type, and type of node is dynamic
-    #usually accepts an ast.AST and returns another but somtimes returns a literal 
-    #ex when the node represents some constant, it returns the constant, which could be one of many types 
-    def __eval(self,node):
+    #Tests n candidates at once, columns maps parameter names to arrays with one value per candidate 
+    #If any candidate divides by zero, overflows, or produces a non-finite value, numpy raises, and the candidates are tested one at a time, so every candidate gets the same result as from test
+    #Candidates are also tested one at a time when a categorical parameter's values convert to different types (ex "True" and "abc"), since numpy would convert them all to strings 
+    def testBatch(self, columns:Dict[str, ndarray], n:int) -> ndarray:
+        values = dict() 
+        mixed = False 
+        for name in self.parameters:
+            column = columns[name]
+            if column.dtype.kind in "OUS":
+                converted = [_constraintValue(x) for x in column]
+                mixed = mixed or len(set(type(x) for x in converted)) > 1
+                column = np.asarray(converted, dtype=object) if mixed else np.asarray(converted)
+            values[name] = column 
+
+        if mixed:
+            return self._testRows(values, n)
+
+        try:
+            with np.errstate(all="raise"):
+                result = np.asarray(self._evaluate(values))
+        except ArithmeticError:
+            return self._testRows(values, n)
+
+        if result.dtype != bool:
+            raise ValueError("Constrains should evaluate to True or False") 
+
+        return np.broadcast_to(result, (n,)).copy()
+
+    #Tests each of the n candidates in values with _test 
+    def _testRows(self, values:Dict[str, ndarray], n:int) -> ndarray:
+        rows = {name:column.tolist() for name,column in values.items()}
+        return np.asarray([self._test({name:rows[name][i] for name in rows}) for i in range(n)], dtype=bool)
+
+    #Converts the parsed expression into a function of a dict of parameter values 
+    #every operand of a comparison chain or boolean operator is evaluated and combined, so the result is the same for scalars and arrays 
+    def __compile(self, node) -> Callable[[dict], object]:
         if isinstance(node, ast.Constant):
-            return node.n
-        elif isinstance(node, ast.Num): 
-            return node.n
-        elif isinstance(node, ast.BinOp): 
-            return self.operators[type(node.op)](self.__eval(node.left), self.__eval(node.right))
-        elif isinstance(node, ast.UnaryOp): 
-            return self.operators[type(node.op)](self.__eval(node.operand))
-        elif isinstance(node, ast.Compare): 
-            return self.operators[type(node.ops[0])](self.__eval(node.left), self.__eval(node.comparators[0]))
-        elif isinstance(node, ast.BoolOp): 
-            return self.operators[type(node.op)](self.__eval(node.values[0]), self.__eval(node.values[1]))
+            value = node.value 
+            return lambda values: value
+        elif isinstance(node, ast.Name) and node.id.startswith(self.prefix):
+            name = node.id[len(self.prefix):]
+            return lambda values: values[name]
+        elif isinstance(node, ast.BinOp) and type(node.op) in self.operators: 
+            f = self.operators[type(node.op)]
+            left = self.__compile(node.left)
+            right = self.__compile(node.right)
+            return lambda values: _finite(f(left(values), right(values)))
+        elif isinstance(node, ast.UnaryOp) and type(node.op) in self.operators: 
+            f = self.operators[type(node.op)]
+            operand = self.__compile(node.operand)
+            return lambda values: _finite(f(operand(values)))
+        elif isinstance(node, ast.Compare) and all(type(x) in self.operators for x in node.ops): 
+            fs = [self.operators[type(x)] for x in node.ops]
+            operands = [self.__compile(x) for x in [node.left] + node.comparators]
+            if len(fs) == 1:
+                f,left,right = fs[0],operands[0],operands[1]
+                return lambda values: f(left(values), right(values))
+            def compare(values):
+                vals = [x(values) for x in operands]
+                return reduce(op.and_, [f(a, b) for f,a,b in zip(fs, vals, vals[1:])])
+            return compare
+        elif isinstance(node, ast.BoolOp) and type(node.op) in self.operators: 
+            f = self.operators[type(node.op)]
+            operands = [self.__compile(x) for x in node.values]
+            return lambda values: reduce(f, [x(values) for x in operands])
         else:
-            raise TypeError(node)
+            raise ValueError("ValueError: Unsupported expression {0} in constraint {1}".format(ast.dump(node), self.expression))
+
+#python returns inf, or a complex number (ex (-1)**0.5), for some arithmetic numpy reports as an error, these raise an ArithmeticError so both fail the constraint 
+def _finite(value):
+    if isinstance(value, complex) or (isinstance(value, float) and not math.isfinite(value)):
+        raise ArithmeticError("Constraint arithmetic produced {0}".format(value))
+    return value 
+
+#Categorical values are used in constraints as the literal they spell, ex "True" is the bool True, values which are not literals are left as strings
+_constraintValues = dict()
+def _constraintValue(value):
+    if not isinstance(value, str):
+        return value 
+    if value not in _constraintValues:
+        try:
+            _constraintValues[value] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            _constraintValues[value] = value 
+    return _constraintValues[value]
 
 #Defines a general parameter 
 class ParameterDefinition:
@@ -148,6 +283,13 @@ class Real(ParameterDefinition):
         except:
             return False
 
+    #Configurations store values as floats, so values are always passed on as floats, ex an int 1 is passed to the target algorithm as 1.0 
+    def encode(self, value:float) -> float:
+        return float(value)
+
+    def decode(self, code:float) -> float:
+        return code
+
 
 #for defining integer valued parameters
 class Integer(ParameterDefinition):
@@ -171,6 +313,10 @@ class Integer(ParameterDefinition):
         if self.lower >= self.upper:
             raise ValueError("ValueError: lower should be less than upper")  
 
+        #Configurations store values as floats (see encode), which only represent every int exactly up to 2**53
+        if self.lower < -2**53 or self.upper > 2**53:
+            raise ValueError("ValueError: For Integers lower and upper should be between -2**53 and 2**53. Parameter: {0}".format(self.name))
+
         if not (self.default <= self.upper and self.default >= self.lower):
             raise ValueError("ValueError: default should be between lower and upper")
 
@@ -181,6 +327,13 @@ class Integer(ParameterDefinition):
         except:
             return False
 
+    #Configurations store values as floats, the range of the parameter is limited so that every value is represented exactly
+    def encode(self, value:int) -> float:
+        return float(int(value))
+
+    def decode(self, code:float) -> int:
+        return int(code)
+
 #for defining categorical parameters
 class Categorical(ParameterDefinition):
     def __init__(self,name:str, type:str, flag:str, default:str, options:List[str]):
@@ -200,6 +353,13 @@ class Categorical(ParameterDefinition):
     def validate(self, value:str)->bool:
         return type(value) == str and value in self.options
 
+    #Configurations store the index of the option 
+    def encode(self, value:str) -> float:
+        return float(self.options.index(value))
+
+    def decode(self, code:float) -> str:
+        return self.options[int(code)]
+
 #a specific value of a parameter
 class ConcreteParameter:
     #Values type depends on the type of parameter, float for Real, int for Integer, etc
@@ -220,42 +380,76 @@ Indicates a required parameter value is missing
 class MissingParameterError(Exception):
     pass
 
+"""
+A read only, dict like view of the values of a Configuration, keyed by parameter name. 
+Each value is returned as a ConcreteParameter, as Configurations used to store them.
+"""
+class ConfigurationValues(Mapping):
+    __slots__ = ("_configuration",)
+
+    def __init__(self, configuration:"Configuration"):
+        self._configuration = configuration
+
+    def __getitem__(self, name:str) -> ConcreteParameter:
+        configDef = self._configuration.configurationDefinition
+        return ConcreteParameter(configDef.parameters[configDef.index[name]], self._configuration[name])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._configuration.configurationDefinition.index)
+
+    def __len__(self) -> int:
+        return len(self._configuration.configurationDefinition.parameters)
+
 """
 This class represents a concrete Configuration. That is, a set of hyper parameters used with the optimizer and all data collected about the optimizer and the use of those parameters. 
+The parameter values are stored compactly in an array of floats, in the order of the ConfigurationDefinition's parameters, see ParameterDefinition.encode
 """
 
 class Configuration:
+    __slots__ = ("configurationDefinition", "_values", "valid", "_ignoreConstraints", "features", "_rawResultLoader", "_rawResult", "seed", "threadID", "characterizeSeed", "generationMethod", "quality")
+
     #configDef should be a ConfigurationDefinition object, initialized from the user provided JSON
     #values should be a dictionary define the value for each parameter. The keys should be the parameter names .
-    def __init__(self, configDef: ConfigurationDefinition, values: dict):
+    #valid may be provided when the constraints were already tested, ex by ConfigurationDefinition.validateBatch 
+    def __init__(self, configDef: ConfigurationDefinition, values: dict, valid:bool=None):
 
-        self._origDict = values
-        
         #the configuration definition acts like a specification, it is used to validate instances of Configuration 
         self.configurationDefinition = configDef
         
-        #stores the concrete parameter, keyed by their names
-        self.values = dict() 
+        #stores the encoded value of each parameter, in the order of configDef.parameters
+        self._values = array("d") 
 
-        #First we need to construct a concrete parameter for each value 
+        #First we need to validate and encode each value 
         for param in configDef.parameters:
             if param.name not in values:
                 raise MissingParameterError("A configuration is missing the parameter {0}".format(param.name))
 
-            self.values[param.name] = ConcreteParameter(param, values[param.name])
+            value = values[param.name]
+            if not param.validate(value):
+                raise ValueError("Invalid value ({0}) for parameter {1}".format(value, param.name))
+
+            self._values.append(param.encode(value))
 
-        #now that all of the Concrete parameters are constructed, we need to validate this configuration 
-        self.valid = True
+        #now that all of the values are stored, we need to validate this configuration 
+        if valid is not None:
+            self.valid = bool(valid)
+        else:
+            self.valid = True
+
+            for constraint in configDef.constraints:
+                if not constraint.test(self):
+                    self.valid=False 
 
-        for constraint in configDef.constraints:
-            if not constraint.test(self):
-                self.valid=False 
+        self._reset()
 
+    #Sets everything except the parameter values and validity to their initial state
+    def _reset(self) -> None:
         #A private flag which can specify that a specific instance of Configuration, and copies made through duplicateParams, can ignore constraints
         self._ignoreConstraints = False 
                 
         #This will be filled in later once the configuration is actually run 
         self.features = None 
+        self._rawResultLoader = None #Configurations loaded from a ConfigurationDB only load their rawResult when it's needed
         self.rawResult = None 
         self.seed = None #Note this is the algorithm seed, it is specific to this execution of the algorithm. This is not the instance seed (if it exists)
         self.threadID = None
@@ -263,20 +457,65 @@ class Configuration:
         self.generationMethod = None #A string representing the method used to generate this configuration 
         self.quality = None #The quality of the best solution produced by this configuration
 
+    #The value of the named parameter 
+    def __getitem__(self, name:str):
+        i = self.configurationDefinition.index[name]
+        return self.configurationDefinition.parameters[i].decode(self._values[i])
+
+    #The values of the parameters as ConcreteParameters keyed by their names, kept for compatibility, prefer configuration[name] or toDict
+    @property
+    def values(self) -> ConfigurationValues:
+        return ConfigurationValues(self)
+
+    #The parameter values as a dict keyed by the parameter names 
+    def toDict(self) -> dict:
+        return {param.name:param.decode(code) for param,code in zip(self.configurationDefinition.parameters, self._values)}
+
+    #The output of the target algorithm produced with this configuration
+    @property
+    def rawResult(self) -> dict:
+        if self._rawResultLoader is not None:
+            self._rawResult = self._rawResultLoader()
+            self._rawResultLoader = None 
+        return self._rawResult
+
+    @rawResult.setter
+    def rawResult(self, val:dict) -> None:
+        self._rawResultLoader = None 
+        self._rawResult = val 
+
+    #loader will be called to produce rawResult the first time it's accessed 
+    def lazyRawResult(self, loader:Callable[[],dict]) -> None:
+        self._rawResultLoader = loader 
+
+    #The loader can't be pickled, so the rawResult is loaded before pickling
+    def __getstate__(self) -> dict:
+        self.rawResult
+        return {x:getattr(self, x) for x in self.__slots__}
+
+    def __setstate__(self, state:dict) -> None:
+        for k,v in state.items():
+            setattr(self, k, v)
+
     #Produces a string of command line arguments which can be passed on to Algorithm
+    #Values are formatted as python formats their type, reals are always formatted as floats, ex 1.0, and integers as ints
     def toFlags(self) -> str:
-        components = [self.values[x].toFlags() for x in self.values]
+        components = ["{0} {1}".format(param.flag, param.decode(code)) for param,code in zip(self.configurationDefinition.parameters, self._values)]
         components.sort() #make the order of flags consistent 
 
         return " ".join(components).strip() 
 
     #Creates a duplicate of this parameter configuration with features, rawResult, seed, and threadID equal to None
     def duplicateParams(self) -> "Configuration":
-        vals = {x:self.values[x].value for x in self.values}
-        ret = Configuration(self.configurationDefinition, vals)
+        #the values were already validated, so they are copied as is 
+        ret = Configuration.__new__(Configuration)
+        ret.configurationDefinition = self.configurationDefinition
+        ret._values = array("d", self._values)
+        ret.valid = self.valid 
+        ret._reset()
 
         if self._ignoreConstraints:
             ret._ignoreConstraints = True 
             ret.valid = True 
             
-        return ret 
\ No newline at end of file
+        return ret
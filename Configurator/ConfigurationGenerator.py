@@ -20,10 +20,12 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 import pickle
 from random import Random
 from statistics import mean
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
 from Configurator.ConfigurationDB import ConfigurationDB
 from Configurator.ConfigurationDefinition import ConfigurationDefinition,Configuration
-from Configurator.Model import LatinHyperCube, NeuralNetwork
+from Configurator.Model import LatinHyperCube, Model, NumpyNetwork
+from Configurator.InferenceServer import RemoteNetwork
+import numpy as np
 from numpy import ndarray
 from copy import deepcopy
 
@@ -56,6 +58,11 @@ class ConfigurationGenerator:
     def _generateWithFeatures(self, features:ndarray) -> Tuple[str,dict]:
         raise NotImplementedError
 
+    #process each row of features to produce a new configuration for each, as _generateWithFeatures would for each row in turn 
+    #ConfigurationGenerators may override this to process the rows together 
+    def _generateBatchWithFeatures(self, features:ndarray) -> List[Tuple[str,dict]]:
+        return [self._generateWithFeatures(x) for x in features]
+
     #update the underlying model(s) 
     def _update(self, confDB:ConfigurationDB) -> None:
         raise NotImplementedError
@@ -79,10 +86,33 @@ class ConfigurationGenerator:
 
         return config
 
+    #generates a configuration from each row of features 
+    def generateBatch(self, features:ndarray) -> List[Configuration]:
+        ret = [] 
+        generated = self._generateBatchWithFeatures(features)
+        #the constraints are tested for the whole batch at once
+        valid = self.confDef.validateBatch(self.confDef.columns([conf for method,conf in generated]))
+        for (method,conf),isValid in zip(generated, valid):
+            config = Configuration(self.confDef, conf, isValid)
+            config.generationMethod = method
+            ret.append(config)
+
+        return ret 
+
     #Should return a copy of the models internal state. Saving and restoring the state of the model should not impact the output of the model.
     def getState(self) -> Dict:
         raise NotImplementedError
 
+    #Should return the state of a ConfigurationGenerator which generates the same configurations as this one, but need not support update. This is the state handed to the runs 
+    #By default this is the full state 
+    def getInferenceState(self) -> Dict:
+        return self.getState()
+
+    #Should return the state of a ConfigurationGenerator which generates the same configurations as this one, sending its predictions to an inference server (see Configurator.InferenceServer), along with the Model the server should predict with
+    #The Model is None if the generator makes no predictions, by default the inference state is returned with no Model
+    def getRemoteState(self) -> Tuple[Dict, Model]:
+        return self.getInferenceState(), None
+
     #Should return a new ConfigurationGenerator initialized with the provided state. Saving and restoring the state of the model should not impact the output of the model.
     @classmethod
     def loadState(cls, state:Dict, seed:int = None) -> None:
@@ -114,12 +144,12 @@ class RandomGenerator(ConfigurationGenerator):
     def _update(self, confDB:ConfigurationDB) -> None:
         iterHist = dict()
         probQuality = dict() 
-        for run in confDB.getDesirables():
-            prob = run.instance.problem 
+        for run in confDB.getDesirableSummaries():
+            prob = run["problem"] 
             if prob not in probQuality:
                 probQuality[prob] = [] 
             
-            probQuality[prob].append(run.quality())
+            probQuality[prob].append(run["quality"])
 
         bestQual = dict()
         aveQual = dict()
@@ -174,11 +204,22 @@ class AdaptiveGenerator(ConfigurationGenerator):
     #maxInformedPercent indicates the maximum percentage of configurations which should be generated via NN prediction
     #informedPercentVariance is the acceptable variance in informedPercent. In pratice the percentage of predictions to perform via NN will be updated periodically, and chosen via informedPercent + N(0, variance)
     #period refers to the initial number of times _generateWithFeatures will be called before the percentage of predictons to perform via NN updates. This value will updated adaptively at run time based on the expected number of calls to _generateWithFeatures per run 
-    def __init__(self, featureSize:int, confDef:ConfigurationDefinition, seed:int, cpu:bool = True, minInformedPercent:float=0.05, maxInformedPercent:float=0.95, informedPercentVariance:float=0.1):
+    #inferenceOnly indicates that the generator will only be used to generate configurations, the network is then evaluated with numpy and can not be trained, so torch is not required
+    #remoteInference indicates that the generator will only be used to generate configurations, and sends its predictions to the inference server this process is connected to, implies inferenceOnly
+    def __init__(self, featureSize:int, confDef:ConfigurationDefinition, seed:int, cpu:bool = True, minInformedPercent:float=0.05, maxInformedPercent:float=0.95, informedPercentVariance:float=0.1, inferenceOnly:bool=False, remoteInference:bool=False):
         super(AdaptiveGenerator,self).__init__(confDef) 
         self.rng = Random(seed)
         self.rndModel = LatinHyperCube(1000, confDef, self.rng.randint(0,4000000000)) 
-        self.nn = NeuralNetwork(featureSize, confDef, self.rng.randint(0,4000000000), cpu)
+        self.inferenceOnly = inferenceOnly or remoteInference
+        self.remoteInference = remoteInference
+        if remoteInference:
+            self.nn = RemoteNetwork(confDef, self.rng.randint(0,4000000000))
+        elif inferenceOnly:
+            self.nn = NumpyNetwork(confDef, self.rng.randint(0,4000000000))
+        else:
+            #torch is only imported when the network needs to be trained 
+            from Configurator.NeuralNetwork import NeuralNetwork
+            self.nn = NeuralNetwork(featureSize, confDef, self.rng.randint(0,4000000000), cpu)
         self.minInformedPercent = minInformedPercent
         self.maxInformedPercent = maxInformedPercent
         self.informedPercentVariance = informedPercentVariance
@@ -219,6 +260,21 @@ class AdaptiveGenerator(ConfigurationGenerator):
             r1,r2 = "Random", self.rndModel.generate(None)
             return r1,r2
 
+    #As _generateWithFeatures for each row, with every informed prediction made in one batch 
+    def _generateBatchWithFeatures(self, features:ndarray) -> List[Tuple[str,dict]]:
+        features = np.asarray(features)
+        informed = np.asarray([self.rng.random() < self._informedPercentRnd for x in range(len(features))], dtype=bool)
+        predictions = iter(self.nn.generateBatch(features[informed]))
+
+        ret = [] 
+        for isInformed in informed:
+            if isInformed:
+                ret.append(("Informed", next(predictions)))
+            else:
+                ret.append(("Random", self.rndModel.generate(None)))
+
+        return ret 
+
     #Testing to see if we can use the RandomGenerator and torch at the same time despite the GIL
     def generate(self, features:ndarray= None) -> Configuration:
 
@@ -253,19 +309,17 @@ class AdaptiveGenerator(ConfigurationGenerator):
         #TODO: once the new evaluator is done (and getDesirables is updated) consider modifying this to grab a sample of desirable runs, then only store the top such and such percent initial configs per problem 
         #that way the generators informed predictions will represent strong initial configs, rather than initial configs the model performed well at improving upon
         probQuality = dict() 
-        for run in confDB.getDesirables(128):
-            self._starterConfigs.append(deepcopy(run.configurations[0]._origDict))
+        for run in confDB.getDesirableSummaries(128):
+            self._starterConfigs.append(run["initialConfiguration"])
 
-            observedConfigs += len(run.configurations)
-            for conf in run.configurations:
-                if conf.generationMethod == "Informed":
-                    observedInformedConfigs += 1 
+            observedConfigs += sum(run["generationMethods"].values())
+            observedInformedConfigs += run["generationMethods"].get("Informed", 0)
 
-            prob = run.instance.problem 
+            prob = run["problem"] 
             if prob not in probQuality:
                 probQuality[prob] = [] 
             
-            probQuality[prob].append(run.quality())
+            probQuality[prob].append(run["quality"])
 
         bestQual = dict()
         aveQual = dict()
@@ -289,8 +343,37 @@ class AdaptiveGenerator(ConfigurationGenerator):
 
     #should return a copy of the models internal state. Saving and restoring the state of the model should not impact the output of the model.
     def getState(self) -> Dict:
+        return self._state(self.nn.state(), self.inferenceOnly, self.remoteInference)
+
+    #The state of an inference only copy of this generator, whose network is a NumpyNetwork
+    def getInferenceState(self) -> Dict:
+        if self.inferenceOnly:
+            return self.getState() 
+        return self._state(self.nn.inferenceState(), True, False)
+
+    #The state of a copy of this generator whose network is a RemoteNetwork, and the NumpyNetwork the inference server should predict with 
+    def getRemoteState(self) -> Tuple[Dict, Model]:
+        if self.remoteInference:
+            return self.getState(), None 
+
+        if self.inferenceOnly:
+            network = self.nn 
+        else:
+            network = NumpyNetwork(self.confDef, 0)
+            network.load(self.nn.inferenceState())
+
+        #the RemoteNetwork continues the random stream of the network 
+        remote = RemoteNetwork(self.confDef, 0)
+        remote.load(network.state()) 
+
+        return self._state(remote.state(), True, True), network 
+
+    #The state of this generator, with the state of the network given by nnState
+    def _state(self, nnState:Dict, inferenceOnly:bool, remoteInference:bool) -> Dict:
         state = dict()
-        state["nn"] = self.nn.state()
+        state["nn"] = nnState
+        state["inferenceOnly"] = inferenceOnly
+        state["remoteInference"] = remoteInference
         state["rnd"] = self.rndModel.state() 
         state["rng"] = pickle.dumps(self.rng)
         state["minInfPerc"] = self.minInformedPercent 
@@ -313,7 +396,8 @@ class AdaptiveGenerator(ConfigurationGenerator):
         else:
             initSeed = seed 
 
-        model = cls(state["featureSize"], pickle.loads(state["confDef"]), initSeed, True, state["minInfPerc"], state["maxInfPerc"], state["infPercVar"])
+        #states saved before inference only generators existed are always full generators 
+        model = cls(state["featureSize"], pickle.loads(state["confDef"]), initSeed, True, state["minInfPerc"], state["maxInfPerc"], state["infPercVar"], state.get("inferenceOnly", False), state.get("remoteInference", False))
 
         model.nn.load(state["nn"])
         model._starterConfigs = state["starterConfigs"]
@@ -58,6 +58,10 @@ class SimpleEvaluator(Evaluator):
 
         tme = self._updatedAt 
         rcrds = configDB.getNew(self._updatedAt)
+
+        #flags are collected, then updated together once all records have been evaluated 
+        desirable = [] 
+        undesirable = [] 
         for rcrd in rcrds:
             
             #keep track of the newest record observed 
@@ -91,9 +95,12 @@ class SimpleEvaluator(Evaluator):
             quals.insert(idx, val)
 
             if idx/len(keys) <= self.x:
-                rcrd.desirable(True)
+                desirable.append(rcrd.id())
             else:
-                rcrd.desirable(False)
+                undesirable.append(rcrd.id())
+
+        configDB.setDesirable(desirable, True)
+        configDB.setDesirable(undesirable, False)
         
         #finally, record the time of the newest observed record 
         self._updatedAt = tme 
@@ -122,14 +129,19 @@ class SimpleEvaluator(Evaluator):
 
     #always asks for more runs of a desirable configuration, until the maximum number of runs per configuration is reached 
     def _alwaysReRun(self, maxRunsPerConfig:int, configDB:ConfigurationDB) -> None:
-        #TODO: this can be much cheaper
+        reRun = [] 
+        noReRun = [] 
         for problem in configDB.problemGenerator():
             for record in problem:
                 if record.desirable():
-                    if len(record.getRuns()) < maxRunsPerConfig:
-                        record.reRun(True)
+                    #each run contributes one quality, so there's no need to load the runs themselves 
+                    if len(record.qualities()) < maxRunsPerConfig:
+                        reRun.append(record.id())
                     else:
-                        record.reRun(False)
+                        noReRun.append(record.id())
+
+        configDB.setReRun(reRun, True)
+        configDB.setReRun(noReRun, False)
 
 #TODO: need a new/better evaluator
 #new version should only consider the runs associated with a particular initial config 
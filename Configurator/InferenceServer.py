@@ -0,0 +1,115 @@
+"""
+Landscape Aware Algorithm Configurator
+Copyright (C) 2021 Cody Dennis
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+An optional server process which makes the predictions of every run in flight. A Runner started with inferenceServer=True starts one alongside its workers, each worker is connected to it by a pipe.
+Runs then use a RemoteNetwork in place of their own network. Requests which arrive within a short window of each other are answered with a single batched forward pass.
+"""
+import pickle
+import time
+from typing import List
+from Configurator.Model import InferenceNetwork
+import numpy as np
+from numpy import ndarray
+from multiprocessing.connection import Connection, wait
+
+#A generic error 
+class InferenceServerError(Exception):
+    pass
+
+#The connection to the inference server used by the runs performed in this process, see connect 
+_connection = None 
+
+#Connects the runs performed by this process to an inference server
+def connect(conn:Connection) -> None:
+    global _connection
+    _connection = conn 
+
+#The main loop of the server process. conns holds a connection to each worker, each request is a matrix of features and is answered with a tuple of (list of configuration dicts, None) or (None, the exception raised)
+#control receives the path of a pickled Model to predict with, sent by the Runner before the runs using it are started, a None tells the server to exit 
+#Once a request arrives the server waits up to window seconds for requests from the other workers, then answers all of them with one call to generateBatch 
+def _server(conns:List[Connection], control:Connection, window:float) -> None:
+    model = None 
+    connected = list(conns)
+    while True:
+        ready = wait(connected + [control])
+
+        #the runner only sends a new model once every run using the previous one has finished, so it is always handled before the requests it applies to
+        if control in ready:
+            path = control.recv()
+            if path is None:
+                break 
+            with open(path, "rb") as inF:
+                model = pickle.loads(inF.read())
+            continue 
+
+        requests = [] 
+        deadline = time.monotonic() + window 
+        while True:
+            for conn in ready:
+                try:
+                    requests.append((conn, conn.recv()))
+                except EOFError:
+                    connected.remove(conn) 
+
+            #each worker has at most one request in flight, so there is nothing to wait for once every worker has made one
+            waiting = [x for x in connected if x not in [conn for conn,features in requests]]
+            remaining = deadline - time.monotonic() 
+            if len(waiting) == 0 or remaining <= 0:
+                break 
+            ready = wait(waiting, remaining) 
+            if len(ready) == 0:
+                break 
+
+        if len(requests) == 0:
+            continue 
+
+        try:
+            if model is None:
+                raise InferenceServerError("No model has been sent to the inference server")
+            preds = model.generateBatch(np.concatenate([features for conn,features in requests]))
+        except Exception as e:
+            for conn,features in requests:
+                conn.send((None, e))
+        else:
+            start = 0 
+            for conn,features in requests:
+                conn.send((preds[start:start+len(features)], None))
+                start += len(features)
+
+    for conn in connected:
+        conn.close()
+    control.close()
+
+"""
+Stands in for the network of a ConfigurationGenerator in a run performed by a Runner's worker, sending the features to predict from to the inference server this process is connected to. 
+The random seeds drawn for each prediction match those of NumpyNetwork, so a run produces the same configurations as it would with its own NumpyNetwork. 
+"""
+class RemoteNetwork(InferenceNetwork):
+
+    #predict a config from each row of features with a single request to the server
+    def _predict(self, features:ndarray) -> List[dict]:
+        if _connection is None:
+            raise InferenceServerError("This process is not connected to an inference server")
+
+        _connection.send(features)
+        preds,err = _connection.recv() 
+        if err is not None:
+            raise err 
+
+        return preds 
@@ -17,16 +17,17 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 from copy import deepcopy
-from io import BytesIO
 import pickle
-from typing import Dict, List
-from Configurator.ConfigurationDefinition import ConfigurationDefinition
+from typing import Dict, List, Tuple
+from Configurator.ConfigurationDefinition import ConfigurationDefinition, ParameterDefinition
 from Configurator.ConfigurationDB import ConfigurationDB
 import numpy as np
 from numpy import ndarray
-from math import isfinite
 from random import Random,seed as setPythonSeed
-import torch
+
+#A generic error 
+class ModelError(Exception):
+    pass
 
 """ 
 This class defines a method for selecting the "next" configuration to be used with the algorithm
@@ -37,6 +38,10 @@ class Model:
     def generate(self, features:ndarray) -> dict:
         config = self._generate(features) 
         return config
+
+    #Produces one configuration dict for each row of features, as generate would for each row in turn
+    def generateBatch(self, features:ndarray) -> List[dict]:
+        return self._generateBatch(features)
     
     #LAAC will provide the configurationDb to the model
     #the ConfigurationDB will contain information about the tested configurations, the runs performed with them, and which configurations respresent desirable output 
@@ -48,6 +53,10 @@ class Model:
     def _generate(self, features:ndarray) -> dict:
         raise NotImplementedError
 
+    #Model implementations may override this to generate many configurations at once, by default each row is generated in turn 
+    def _generateBatch(self, features:ndarray) -> List[dict]:
+        return [self._generate(x) for x in features]
+
     #Model implementations must provide a method for updating themselves from a ConfigurationDB 
     def _update(self, configs:ConfigurationDB) -> None:
         raise NotImplementedError
@@ -143,283 +152,144 @@ class LatinHyperCube(Model):
         self.bufferSize = state["bufferSize"] 
         self.rng = pickle.loads(state["rng"])
 
-class _NeuralNetworkModel(torch.nn.Module):
-    def __init__(self, inputSize:int, configDef:ConfigurationDefinition, cpu:bool=True):
-        super(_NeuralNetworkModel, self).__init__()
-    
-        #construct the network to train for regression 
-
-        self.input = torch.nn.Sequential(
-                            torch.nn.Linear(inputSize, 500),
-                            torch.nn.ELU()
-                        )
-        
-        self.features = torch.nn.Sequential(
-                            torch.nn.Linear(500, 250),
-                            torch.nn.ELU(),
-                            torch.nn.Linear(250, 125),
-                            torch.nn.ELU(),
-                            torch.nn.Linear(125, 50),
-                            torch.nn.ELU()
-                        )
-
-        #construct regressors (and possibly classifiers) for each parameter to predict
-        self.output = []
-
-        for param in configDef.parameters:
-            if param.type == "real" or param.type == "integer":
-                head = torch.nn.Sequential(
-                            torch.nn.Linear(50, 1),
-                            torch.nn.Tanh()
-                        )
-                criteria = torch.nn.MSELoss()
-                self.output.append((param, head, criteria))
-            if param.type == "categorical":
-                head = torch.nn.Sequential(
-                            torch.nn.Linear(50, len(param.options))
-                )
-                criteria = torch.nn.CrossEntropyLoss() 
-                self.output.append((param, head, criteria))
-
-    def forward(self, x):
-        x = self.input(x) 
-        x = self.features(x) 
-        out = [] 
-        for param,head,criteria in self.output:
-            out.append((param,head(x),criteria))
-        
-        return out
-
-
-class NeuralNetwork(Model):
-    
-    def __init__(self, inputSize:int, configDef:ConfigurationDefinition, seed:int, cpu:bool=True):
-        super(NeuralNetwork, self).__init__() 
+#Draws the seeds for n predictions from rng, seeds numpy and python with those of the last prediction, and returns them 
+#Each prediction draws the three seeds a call to generate draws, so the rng and the global seeds end up the same whether n configurations are generated in one batch or one at a time
+#The forward pass itself is deterministic, so the rows of a batch don't need seeds of their own 
+def _advanceSeeds(rng:Random, n:int) -> List[int]:
+    for row in range(n):
+        seeds = [rng.randint(0,4000000000) for x in range(3)]
+    np.random.seed(seeds[1])
+    setPythonSeed(seeds[2])
+    return seeds 
+
+#TODO: update this to better handle nans, infs, large numbers, and potential roundoff errors
+#Standardizes the feature vectors in x as x*scale + shift, treating non-finite values as 0 
+def _standardize(x:ndarray, scale:ndarray, shift:ndarray) -> ndarray:
+
+    #featureArray = np.nan_to_num(x, nan=0, posinf=3.4028237e16, neginf=-3.4028237e16)
+    featureArray = np.nan_to_num(x, nan=0, posinf=0, neginf=0)
+
+    featureArray = np.asarray(featureArray, np.float32)
+
+    featureArray = featureArray*scale + shift
+    featureArray = np.nan_to_num(featureArray, nan=0, posinf=0, neginf=0)
+
+    return featureArray
+
+#Converts the outputs of a network into n configuration dicts, one per example 
+#outputs is a list of (parameter, predictions) pairs, with one row of predictions per example 
+#numeric parameters are predicted in [-1, 1] and scaled back to their range, categorical parameters take the option with the largest output 
+def _decodePredictions(outputs:List[Tuple[ParameterDefinition, ndarray]], n:int) -> List[dict]:
+    ret = [dict() for x in range(n)]
+
+    for param,pred in outputs:
+        if param.type == "real" or param.type == "integer":
+            vals = np.asarray(pred[:,0], dtype=np.float64)
+            finite = np.isfinite(vals)
+            vals = (vals + 1.0)/2.0 
+            vals = (vals*(param.upper - param.lower)) + param.lower
+            vals = np.where(finite, vals, param.default).tolist() #TODO: different nan handling?
+            if param.type == "integer":
+                vals = [int(x) for x in vals]
+        elif param.type == "categorical":
+            vals = [param.options[x] for x in np.argmax(pred, axis=1).tolist()]
+
+        for conf,val in zip(ret, vals):
+            conf[param.name] = val
+
+    return ret
 
+"""
+The base of models which generate configurations with a network trained elsewhere, by a NeuralNetwork (see Configurator.NeuralNetwork), and can not be trained themselves. 
+Implementations provide _predict, which makes the predictions for a batch of features once the random seeds for the batch have been drawn.
+"""
+class InferenceNetwork(Model):
+    def __init__(self, configDef:ConfigurationDefinition, seed:int):
+        super(InferenceNetwork, self).__init__() 
+        self.configDef = configDef 
         self.origSeed = seed 
         self.rng = Random(seed) 
-        torch.cuda.manual_seed_all(self.rng.randint(0,4000000000))
-        #A bunch of stuff to make sure pytorch is reproducible 
-        #Commenting this out may improve performance in some cases 
-        torch.set_deterministic(True)
-        #os.environ['PYTHONHASHSEED'] = str(seed)
-        setPythonSeed(seed)
-        torch.manual_seed(self.rng.randint(0,4000000000))
-        
-        torch.backends.cudnn.deterministic = True
-        torch.backends.cudnn.benchmark = False
-        np.random.seed(self.rng.randint(0,4000000000))
-
-        self.predictor = _NeuralNetworkModel(inputSize, configDef) 
-        self.predictor.eval()
-        #self.predictor.to(self.device)
-
-        #TODO: make training paramters, network arch, etc configurable
-        #num examples drawn from dataset
-        self.batchSize = 128
-        self.lr = 0.001
-        self.momentum = 0.1
-        self.epochs = 20
-        self.optimizer =torch.optim.RMSprop(self.predictor.parameters(), lr=self.lr, momentum=self.momentum)
-        # self.batchSize = 32
-        # self.lr = 0.00000001
-        # self.momentum = 0.000001
-        # self.epochs = 20
-        # self.optimizer =torch.optim.SGD(self.predictor.parameters(), lr=self.lr, momentum=self.momentum)
-        self.history = [] 
-         
-
-    def _getExamples(self,configs:ConfigurationDB, k):
-        examples = []
-        for run in configs.getDesirables(k):
-            examples.append(run) 
-        
-        #convert the runs into training examples 
-        featureArray = []
-        confs = [] 
-        for run in examples:
-            for i,c in enumerate(run.configurations[1:]):
-                featureArray.append(run.configurations[i].features)
-                confs.append(c)
-    
-        featureArray = self.__cleanInput(featureArray)
 
-        examples = [x for x in zip(featureArray,confs)]
-
-        return examples
-
-    #train the model
+    #the network is trained by NeuralNetwork
     def _update(self, configs:ConfigurationDB) -> None:
-        #TODO???
-        torch.manual_seed(self.rng.randint(0,4000000000))
-        np.random.seed(self.rng.randint(0,4000000000))
-        setPythonSeed(self.rng.randint(0,4000000000))
-        #torch.cuda.manual_seed_all(self.rng.randint(0,4000000000))
-        #######
-    
-        self.predictor.train()
-
-        optimizer = self.optimizer 
-        optimizer.zero_grad()
-        loss = None
-
-        lossList = [] 
-
-        MAXEXAMPLES = 128
-
-        for e in range(self.epochs):
-
-            
-            examples = self._getExamples(configs, MAXEXAMPLES)
-
-            for i in range(0, len(examples), self.batchSize):
-                data = examples[i:i+self.batchSize]
-
-                pattern = np.asarray([x[0] for x in data])
-                targets = [x[1] for x in data]
-
-                #calculated and propagate loss for all outputs
-                pattern = torch.from_numpy(pattern)
-
-                outputs = self.predictor(pattern.float())
-
-                for out in outputs:
-                    targetVals = [] 
-
-                    for config in targets:
-                        targetVal = config.values[out[0].name].value 
-
-                        if out[0].type == "real" or out[0].type == "integer":
-                            targetVal = [self.__normalizeNumeric(targetVal, out[0])]
-                        elif out[0].type == "categorical":
-                            targetVal = self.__categoryToPred(targetVal, out[0])
-
-                        targetVals.append(targetVal) 
-
-                    targetVals = torch.tensor(targetVals)
-
-                    criteria = out[2]
-                    if loss is None:
-                        loss = criteria(out[1], targetVals) 
-                    else:
-                        loss += criteria(out[1], targetVals)
-                
-                
-
-
-                loss = loss/len(data)
-                loss.backward()
-                optimizer.step()
-                optimizer.zero_grad()
-                lossList.append(loss.item()) 
-                loss = None
-
-        self.predictor.eval()
-        self.history.append(lossList)
-        
+        raise ModelError("An inference only network can not be trained, train a NeuralNetwork and load its inferenceState instead")
 
     #generate a config from the provided features
     def _generate(self, features:ndarray) -> dict:
-         #TODO???
-        torch.manual_seed(self.rng.randint(0,4000000000))
-        np.random.seed(self.rng.randint(0,4000000000))
-        setPythonSeed(self.rng.randint(0,4000000000))
-        #torch.cuda.manual_seed_all(self.rng.randint(0,4000000000))
-        #####
-        dta = self.__cleanInput(np.asarray([features],dtype=np.float32))
-        dta = torch.from_numpy(dta)
-        #dta.to(self.device) 
-
-        
-        preds = self.predictor(dta)
-        ret = dict() 
-
-        for pred in preds:
-            if pred[0].type == "real":
-                val = self.__denormalizeNumeric(pred[1][0].item(), pred[0])
-                ret[pred[0].name] = val
-            elif pred[0].type == "integer":
-                val = self.__denormalizeNumeric(pred[1][0].item(), pred[0])
-                ret[pred[0].name] = int(val)
-            elif pred[0].type == "categorical":
-                ret[pred[0].name] = self.__predToCategory(pred[1][0], pred[0])
-
-        return ret
+        return self._generateBatch(np.asarray([features],dtype=np.float32))[0]
+
+    #generate a config from each row of features 
+    def _generateBatch(self, features:ndarray) -> List[dict]:
+        if len(features) == 0:
+            return [] 
+        #the same seeds are drawn as by NeuralNetwork, so predictions continue the same random streams
+        _advanceSeeds(self.rng, len(features))
+        return self._predict(np.asarray(features,dtype=np.float32))
+
+    #Implementations must return one configuration dict per row of features 
+    def _predict(self, features:ndarray) -> List[dict]:
+        raise NotImplementedError
 
     #returns a dict defining the internal state of the model 
     def state(self) -> Dict:
-        
         state = dict() 
         state["rng"] = pickle.dumps(self.rng)
-        #state["nnParams"] = pickle.dumps(self.predictor.state_dict()) 
-        state["batchSize"] = self.batchSize 
-        state["lr"] = self.lr
-        state["momentum"] = self.momentum 
-        state["epochs"] = self.epochs 
-        #state["optimizerParams"] = pickle.dumps(self.optimizer.state_dict()) 
         state["origSeed"] = self.origSeed 
-        #state["predictor"] = pickle.dumps(self.predictor) 
-        #state["optimizer"] = pickle.dumps(self.optimizer)
-        nnStateBytes = BytesIO()
-        torch.save({'predictor':self.predictor.state_dict(), 'optimizer':self.optimizer.state_dict()}, nnStateBytes, pickle_module=pickle)
-        nnStateBytes.seek(0)
-        state["torchParams"] = pickle.dumps(nnStateBytes) 
-        
         return state 
 
     #loads the provided state into the model.
     def load(self, state:Dict) -> None:
-        state = deepcopy(state)
         self.rng = pickle.loads(state["rng"])
         self.origSeed = state["origSeed"] 
-        self.batchSize = state["batchSize"]
-        self.lr = state["lr"] 
-        self.momentum = state["momentum"]
-        self.epochs = state["epochs"] 
-        
-        nnState = torch.load(pickle.loads(state["torchParams"])) 
-        self.predictor.load_state_dict(nnState["predictor"]) 
-        self.optimizer.load_state_dict(nnState["optimizer"])
-        self.predictor.eval()
-
-    #TODO: update this to better handle nans, infs, large numbers, and potential roundoff errors
-    def __cleanInput(self,x):
-
-        #featureArray = np.nan_to_num(x, nan=0, posinf=3.4028237e16, neginf=-3.4028237e16)
-        featureArray = np.nan_to_num(x, nan=0, posinf=0, neginf=0)
-
-        featureArray = np.asarray(featureArray, np.float32)
-    
-        avg = np.mean(featureArray, axis=0)
-        std = np.std(featureArray, axis=0) 
-        std[std == 0] = 0.000001
-        avg = np.nan_to_num(avg, nan=0, posinf=0, neginf=0)
-        featureArray = ((featureArray - avg)/std)
-        featureArray = np.nan_to_num(featureArray, nan=0, posinf=0, neginf=0)
 
-        return featureArray
+"""
+An inference only copy of a trained NeuralNetwork (see Configurator.NeuralNetwork), which performs the forward pass with numpy, so torch is not needed to generate configurations.
+The network is defined by the state produced by NeuralNetwork.inferenceState.
+"""
+class NumpyNetwork(InferenceNetwork):
+    def __init__(self, configDef:ConfigurationDefinition, seed:int):
+        super(NumpyNetwork, self).__init__(configDef, seed) 
+
+        #hidden layers as (weight, bias) pairs, each is followed by an ELU 
+        self.layers = [] 
+        #output layers as (parameter name, weight, bias), numeric outputs are followed by a tanh 
+        self.heads = [] 
+        self._featureScale = None
+        self._featureShift = None
+
+    #predict a config from each row of features with a single forward pass 
+    def _predict(self, features:ndarray) -> List[dict]:
+        x = _standardize(features, self._featureScale, self._featureShift)
+
+        #einsum computes each row on its own, so a row's prediction does not depend on the rest of the batch (a BLAS matrix product may round differently for different batch sizes)
+        for weight,bias in self.layers:
+            x = np.einsum("ij,kj->ik", x, weight) + bias 
+            x = np.where(x > 0, x, np.expm1(np.minimum(x, 0)))
+
+        params = {x.name:x for x in self.configDef.parameters}
+        outputs = [] 
+        for name,weight,bias in self.heads:
+            pred = np.einsum("ij,kj->ik", x, weight) + bias 
+            if params[name].type == "real" or params[name].type == "integer":
+                pred = np.tanh(pred)
+            outputs.append((params[name], pred))
+
+        return _decodePredictions(outputs, len(features))
 
-            
-    def __denormalizeNumeric(self, value, param):
-        if isfinite(value): #TODO: different nan handling?
-            val = value
-            val = (val + 1.0)/2.0 
-            val = (val*(param.upper - param.lower)) + param.lower
-            return val
-        else:
-            return param.default
-
-    def __normalizeNumeric(self, value, param):
-        if isfinite(value): #TODO: different nan handling?
-            val = value
-        else:
-            val = param.default
-        val = (val - param.lower)/(param.upper - param.lower) 
-        val = (val*2.0) - 1.0
-        return val 
-
-    def __predToCategory(self, value, param):
-        return param.options[torch.argmax(value[0])] 
-
-    def __categoryToPred(self, value, param):
-        return param.options.index(value)
+    #returns a dict defining the internal state of the model 
+    def state(self) -> Dict:
+        state = super(NumpyNetwork, self).state() 
+        state["featureScale"] = self._featureScale.copy()
+        state["featureShift"] = self._featureShift.copy()
+        state["layers"] = [(weight.copy(), bias.copy()) for weight,bias in self.layers]
+        state["heads"] = [(name, weight.copy(), bias.copy()) for name,weight,bias in self.heads]
+        return state 
+
+    #loads the provided state into the model.
+    def load(self, state:Dict) -> None:
+        super(NumpyNetwork, self).load(state) 
+        state = deepcopy(state)
+        self._featureScale = np.asarray(state["featureScale"], np.float32)
+        self._featureShift = np.asarray(state["featureShift"], np.float32)
+        self.layers = state["layers"]
+        self.heads = state["heads"] 
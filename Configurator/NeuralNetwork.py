@@ -0,0 +1,334 @@
+"""
+Landscape Aware Algorithm Configurator
+Copyright (C) 2021 Cody Dennis
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Lesser General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+"""
+The torch implementation of the neural network used to predict configurations. torch is only needed to train the network, see Configurator.Model.NumpyNetwork for inference.
+"""
+from copy import deepcopy
+from io import BytesIO
+import pickle
+from typing import Dict, List, Tuple
+from Configurator.ConfigurationDefinition import ConfigurationDefinition
+from Configurator.ConfigurationDB import ConfigurationDB
+from Configurator.Model import Model, _advanceSeeds, _decodePredictions, _standardize
+import numpy as np
+from numpy import ndarray
+from random import Random,seed as setPythonSeed
+import torch
+
+class _NeuralNetworkModel(torch.nn.Module):
+    def __init__(self, inputSize:int, configDef:ConfigurationDefinition, cpu:bool=True):
+        super(_NeuralNetworkModel, self).__init__()
+    
+        #construct the network to train for regression 
+
+        self.input = torch.nn.Sequential(
+                            torch.nn.Linear(inputSize, 500),
+                            torch.nn.ELU()
+                        )
+        
+        self.features = torch.nn.Sequential(
+                            torch.nn.Linear(500, 250),
+                            torch.nn.ELU(),
+                            torch.nn.Linear(250, 125),
+                            torch.nn.ELU(),
+                            torch.nn.Linear(125, 50),
+                            torch.nn.ELU()
+                        )
+
+        #construct regressors (and possibly classifiers) for each parameter to predict
+        self.output = []
+
+        for param in configDef.parameters:
+            if param.type == "real" or param.type == "integer":
+                head = torch.nn.Sequential(
+                            torch.nn.Linear(50, 1),
+                            torch.nn.Tanh()
+                        )
+                criteria = torch.nn.MSELoss()
+                self.output.append((param, head, criteria))
+            if param.type == "categorical":
+                head = torch.nn.Sequential(
+                            torch.nn.Linear(50, len(param.options))
+                )
+                criteria = torch.nn.CrossEntropyLoss() 
+                self.output.append((param, head, criteria))
+
+    def forward(self, x):
+        x = self.input(x) 
+        x = self.features(x) 
+        out = [] 
+        for param,head,criteria in self.output:
+            out.append((param,head(x),criteria))
+        
+        return out
+
+
+class NeuralNetwork(Model):
+    
+    def __init__(self, inputSize:int, configDef:ConfigurationDefinition, seed:int, cpu:bool=True):
+        super(NeuralNetwork, self).__init__() 
+
+        self.origSeed = seed 
+        self.rng = Random(seed) 
+        torch.cuda.manual_seed_all(self.rng.randint(0,4000000000))
+        #A bunch of stuff to make sure pytorch is reproducible 
+        #Commenting this out may improve performance in some cases 
+        torch.set_deterministic(True)
+        #os.environ['PYTHONHASHSEED'] = str(seed)
+        setPythonSeed(seed)
+        torch.manual_seed(self.rng.randint(0,4000000000))
+        
+        torch.backends.cudnn.deterministic = True
+        torch.backends.cudnn.benchmark = False
+        np.random.seed(self.rng.randint(0,4000000000))
+
+        self.predictor = _NeuralNetworkModel(inputSize, configDef) 
+        self.predictor.eval()
+        #self.predictor.to(self.device)
+
+        #TODO: make training paramters, network arch, etc configurable
+        #num examples drawn from dataset
+        self.batchSize = 128
+        self.lr = 0.001
+        self.momentum = 0.1
+        self.epochs = 20
+        self.optimizer =torch.optim.RMSprop(self.predictor.parameters(), lr=self.lr, momentum=self.momentum)
+        # self.batchSize = 32
+        # self.lr = 0.00000001
+        # self.momentum = 0.000001
+        # self.epochs = 20
+        # self.optimizer =torch.optim.SGD(self.predictor.parameters(), lr=self.lr, momentum=self.momentum)
+        self.history = [] 
+
+        #The training examples of each desirable record, keyed by record id, as a tuple of (features, encoded targets)
+        #The targets are encoded as by _encodeTargets when the examples enter the buffer 
+        #Refreshed from the records modified since _examplesUpdatedAt, so only new or changed records are read from the DB 
+        #The buffer mirrors the DB, so it is not part of the model's state 
+        self._examples = dict() 
+        self._examplesUpdatedAt = 0
+
+        #Features are standardized as features*_featureScale + _featureShift, using the mean and std of the features in the training buffer 
+        #Until the first update features are used as is 
+        self._featureScale = np.ones(inputSize, dtype=np.float32)
+        self._featureShift = np.zeros(inputSize, dtype=np.float32)
+         
+
+    #Brings the training buffer up to date with configs 
+    def _refreshExamples(self, configs:ConfigurationDB) -> None:
+        changed = [x for x in configs.getNew(self._examplesUpdatedAt)]
+        if len(changed) == 0:
+            return 
+
+        for rcrd in changed:
+            self._examples.pop(rcrd.id(), None) 
+
+        recordIDs, features, targets = configs.getTrainingData([x.id() for x in changed if x.desirable()])
+
+        #examples are grouped by record 
+        start = 0 
+        for end in range(1, len(recordIDs)+1):
+            if end == len(recordIDs) or recordIDs[end] != recordIDs[start]:
+                self._examples[recordIDs[start]] = (features[start:end], self._encodeTargets(targets[start:end]))
+                start = end 
+
+        self._examplesUpdatedAt = max(x.updatedAt() for x in changed) + 1
+
+        self._updateNormalization()
+
+    #Recomputes the feature normalization statistics from the training buffer 
+    def _updateNormalization(self) -> None:
+        if len(self._examples) == 0:
+            return 
+
+        featureArray = np.concatenate([self._examples[x][0] for x in sorted(self._examples)])
+        featureArray = np.nan_to_num(featureArray, nan=0, posinf=0, neginf=0)
+        featureArray = np.asarray(featureArray, np.float32)
+
+        avg = np.mean(featureArray, axis=0)
+        std = np.std(featureArray, axis=0) 
+        std[std == 0] = 0.000001
+        avg = np.nan_to_num(avg, nan=0, posinf=0, neginf=0)
+
+        self._featureScale = np.asarray(1.0/std, np.float32)
+        self._featureShift = np.asarray(-avg/std, np.float32)
+
+    #Encodes the parameter values in targets as the training targets of each output of the predictor 
+    #numeric parameters are normalized to [-1, 1] as an (n,1) float array, categorical parameters become an array of option indices 
+    def _encodeTargets(self, targets:List[dict]) -> List[ndarray]:
+        encoded = [] 
+        for param,_,_ in self.predictor.output:
+            if param.type == "real" or param.type == "integer":
+                vals = np.asarray([x[param.name] for x in targets], dtype=np.float64)
+                vals[~np.isfinite(vals)] = param.default #TODO: different nan handling?
+                vals = (vals - param.lower)/(param.upper - param.lower) 
+                vals = (vals*2.0) - 1.0
+                encoded.append(vals.astype(np.float32).reshape(-1,1))
+            elif param.type == "categorical":
+                indices = {x:i for i,x in enumerate(param.options)}
+                encoded.append(np.asarray([indices[x[param.name]] for x in targets], dtype=np.int64))
+        return encoded 
+
+    #Draws the examples of up to k random records from the training buffer 
+    #Returns the standardized features of the examples, and the encoded targets of each output of the predictor 
+    def _getExamples(self, k:int) -> Tuple[ndarray, List[ndarray]]:
+        ids = sorted(self._examples) 
+        if k < len(ids):
+            ids = sorted(self.rng.sample(ids, k))
+
+        if len(ids) == 0:
+            return np.empty((0,0), dtype=np.float32), [] 
+
+        featureArray = self.__cleanInput(np.concatenate([self._examples[x][0] for x in ids]))
+        targets = [np.concatenate(x) for x in zip(*[self._examples[x][1] for x in ids])]
+
+        return featureArray, targets
+
+    #train the model
+    def _update(self, configs:ConfigurationDB) -> None:
+        #TODO???
+        torch.manual_seed(self.rng.randint(0,4000000000))
+        np.random.seed(self.rng.randint(0,4000000000))
+        setPythonSeed(self.rng.randint(0,4000000000))
+        #torch.cuda.manual_seed_all(self.rng.randint(0,4000000000))
+        #######
+    
+        self.predictor.train()
+
+        optimizer = self.optimizer 
+        optimizer.zero_grad()
+        loss = None
+
+        lossList = [] 
+
+        MAXEXAMPLES = 128
+
+        self._refreshExamples(configs)
+
+        for e in range(self.epochs):
+
+            
+            featureArray, targets = self._getExamples(MAXEXAMPLES)
+
+            for i in range(0, len(featureArray), self.batchSize):
+                pattern = featureArray[i:i+self.batchSize]
+
+                #calculated and propagate loss for all outputs
+                pattern = torch.from_numpy(pattern)
+
+                outputs = self.predictor(pattern.float())
+
+                for out,target in zip(outputs, targets):
+                    targetVals = torch.from_numpy(target[i:i+self.batchSize])
+
+                    criteria = out[2]
+                    if loss is None:
+                        loss = criteria(out[1], targetVals) 
+                    else:
+                        loss += criteria(out[1], targetVals)
+                
+                
+
+
+                loss = loss/len(pattern)
+                loss.backward()
+                optimizer.step()
+                optimizer.zero_grad()
+                lossList.append(loss.item()) 
+                loss = None
+
+        self.predictor.eval()
+        self.history.append(lossList)
+        
+
+    #generate a config from the provided features
+    def _generate(self, features:ndarray) -> dict:
+        return self._generateBatch(np.asarray([features],dtype=np.float32))[0]
+
+    #generate a config from each row of features with a single forward pass 
+    def _generateBatch(self, features:ndarray) -> List[dict]:
+        if len(features) == 0:
+            return [] 
+        seeds = _advanceSeeds(self.rng, len(features))
+        torch.manual_seed(seeds[0])
+        dta = self.__cleanInput(np.asarray(features,dtype=np.float32))
+        dta = torch.from_numpy(dta)
+        #dta.to(self.device) 
+
+        
+        with torch.no_grad():
+            preds = self.predictor(dta)
+
+        return _decodePredictions([(param, pred.numpy()) for param,pred,criteria in preds], len(features))
+
+    #returns a dict defining the internal state of the model 
+    def state(self) -> Dict:
+        
+        state = dict() 
+        state["rng"] = pickle.dumps(self.rng)
+        #state["nnParams"] = pickle.dumps(self.predictor.state_dict()) 
+        state["batchSize"] = self.batchSize 
+        state["lr"] = self.lr
+        state["momentum"] = self.momentum 
+        state["epochs"] = self.epochs 
+        #state["optimizerParams"] = pickle.dumps(self.optimizer.state_dict()) 
+        state["origSeed"] = self.origSeed 
+        state["featureScale"] = self._featureScale.copy()
+        state["featureShift"] = self._featureShift.copy()
+        #state["predictor"] = pickle.dumps(self.predictor) 
+        #state["optimizer"] = pickle.dumps(self.optimizer)
+        nnStateBytes = BytesIO()
+        torch.save({'predictor':self.predictor.state_dict(), 'optimizer':self.optimizer.state_dict()}, nnStateBytes, pickle_module=pickle)
+        nnStateBytes.seek(0)
+        state["torchParams"] = pickle.dumps(nnStateBytes) 
+        
+        return state 
+
+    #returns the state of a NumpyNetwork which makes the same predictions as this network, without needing torch
+    def inferenceState(self) -> Dict:
+        state = dict() 
+        state["rng"] = pickle.dumps(self.rng)
+        state["origSeed"] = self.origSeed 
+        state["featureScale"] = self._featureScale.copy()
+        state["featureShift"] = self._featureShift.copy()
+        layers = [x for x in list(self.predictor.input) + list(self.predictor.features) if isinstance(x, torch.nn.Linear)]
+        state["layers"] = [(x.weight.detach().numpy().copy(), x.bias.detach().numpy().copy()) for x in layers]
+        state["heads"] = [(param.name, head[0].weight.detach().numpy().copy(), head[0].bias.detach().numpy().copy()) for param,head,criteria in self.predictor.output]
+        return state 
+
+    #loads the provided state into the model.
+    def load(self, state:Dict) -> None:
+        state = deepcopy(state)
+        self.rng = pickle.loads(state["rng"])
+        self.origSeed = state["origSeed"] 
+        self.batchSize = state["batchSize"]
+        self.lr = state["lr"] 
+        self.momentum = state["momentum"]
+        self.epochs = state["epochs"] 
+        #states saved before the normalization statistics were kept use the features unscaled 
+        self._featureScale = np.asarray(state.get("featureScale", np.ones_like(self._featureScale)), np.float32)
+        self._featureShift = np.asarray(state.get("featureShift", np.zeros_like(self._featureShift)), np.float32)
+        
+        nnState = torch.load(pickle.loads(state["torchParams"])) 
+        self.predictor.load_state_dict(nnState["predictor"]) 
+        self.optimizer.load_state_dict(nnState["optimizer"])
+        self.predictor.eval()
+
+    #Standardizes x with the normalization statistics of the training buffer 
+    def __cleanInput(self,x):
+        return _standardize(x, self._featureScale, self._featureShift)
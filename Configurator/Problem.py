@@ -65,6 +65,14 @@ class Instance:
         self.problem = problem.toFlags() 
         self.flags = instanceData 
 
+    #Reconstructs an instance from the flags of its problem and the instance flags, ie when loading stored runs 
+    @classmethod
+    def fromFlags(cls, problem:str, flags:str) -> "Instance":
+        instance = cls.__new__(cls)
+        instance.problem = problem 
+        instance.flags = flags 
+        return instance 
+
     def toFlags(self)->str:
         return "{0} {1}".format(self.problem, self.flags)
 
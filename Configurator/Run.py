@@ -21,8 +21,14 @@ Wraps the information defining a run
 """
 
 from Configurator.Problem import Instance
+import hashlib
 import time 
 
+#python's str hash is seeded per process, so identifiers written to a ConfigurationDB use this instead, which is the same in every process (ie a Runner's workers) and across sessions
+#returns a signed 64 bit int, so it can be stored as a sqlite INTEGER 
+def stableHash(text:str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
 class Run:
     
     def __init__(self, instance: Instance) -> None:
@@ -48,9 +54,9 @@ class Run:
 
     #produces a unique identifier corresponding to the problem 
     def problem(self) -> int:
-        return self.instance.problem.__hash__()
+        return stableHash(self.instance.problem)
 
     #produces a unique identifier corresponding to the initial configuration of the run 
     #subsequent configurations depend on the solutions sampled, the features produced, and the model, so they may change for different instances of the problem
     def runConfigID(self) -> int:
-        return self.configurations[0].toFlags().__hash__()
\ No newline at end of file
+        return stableHash(self.configurations[0].toFlags())
\ No newline at end of file
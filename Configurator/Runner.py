@@ -15,7 +15,7 @@ GNU General Public License for more details.
 You should have received a copy of the GNU Lesser General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
-from typing import Callable, List, Tuple
+from typing import Iterator, List, Tuple
 from Configurator.Algorithm import Algorithm
 from Configurator.Problem import Instance
 from Configurator.TerminationCondition import TerminationCondition
@@ -25,14 +25,66 @@ from Configurator.ConfigurationGenerator import ConfigurationGenerator
 from random import Random
 from Configurator.Characterizer import Characterizer
 from Configurator.ProblemSuite import ProblemSuite
-from copy import deepcopy
-from multiprocessing import Process, Manager
-import time 
+from Configurator.ConfigurationDB import sqlite3ConfigurationDB
+from Configurator.InferenceServer import _server, connect
+from multiprocessing import Process, Pipe
+from multiprocessing.connection import Connection, wait
+import os
+import pickle
+import shutil
+import tempfile
 
-#A wrapper to capture the return value of alg
-def _algWrapper(alg:Callable, args:tuple, out:list):
-    result = alg(*args)
-    out.append(result)
+#A generic error 
+class RunnerError(Exception):
+    pass
+
+#The main loop of a worker process. Workers are started once and then perform runs as they are sent over conn, so the cost of starting an interpreter and importing LAAC (and torch, numpy, etc) is paid once per worker rather than once per run 
+#Each job is a tuple of (the arguments for Algorithm.run other than modelState, model, store), a None job tells the worker to exit. After each job the worker sends back a tuple of (Run, None) or (None, the exception raised during the run) over the same connection 
+#model is a tuple (path, version) identifying the snapshot of the model state written by Runner._writeSnapshot. The worker keeps the last snapshot it loaded, so each snapshot is read once per worker rather than sent with every job 
+#If inference is not None the runs performed by the worker send their predictions to the inference server over it 
+#If store is not None it is a tuple (path, iteration), and the worker adds the Run directly to the sqlite3ConfigurationDB at path, marked as performed on iteration, and sends back None in place of the Run
+def _worker(alg:Algorithm, conn:Connection, inference:Connection=None) -> None:
+    if inference is not None:
+        connect(inference)
+
+    configDB = None 
+    modelState = None 
+    modelVersion = None 
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+
+        args,model,store = job
+        try:
+            path,version = model 
+            if version != modelVersion:
+                with open(path, "rb") as inF:
+                    modelState = pickle.loads(inF.read())
+                modelVersion = version 
+
+            #the model state is the fourth argument of Algorithm.run
+            result = alg.run(*args[:3], modelState, *args[3:])
+
+            if store is not None:
+                path,iteration = store 
+                if configDB is None or configDB.path != path:
+                    if configDB is not None:
+                        configDB.close()
+                    configDB = sqlite3ConfigurationDB(path)
+
+                result.performedOnIteration = iteration 
+                configDB.addRun(result)
+                result = None 
+        except Exception as e:
+            conn.send((None, e))
+        else:
+            conn.send((result, None))
+
+    if configDB is not None:
+        configDB.close()
+    alg.close()
+    conn.close()
 
 """
 Runners are responsible for collecting runs of the target algorithm. This involves performing additional runs of existing configurations, as well as obtaining/running new configurations from the model. Runners are responsible for generatin the specific problem instances a configuration is evaluated on and ensuring the data we collect about a configuration provides a reliable description of the configuration.
@@ -40,7 +92,8 @@ Runners are responsible for collecting runs of the target algorithm. This involv
 #TODO: evaluate configurations over a limited pool of instances to reduce variance? 
 
 class Runner:
-    def __init__(self, problemSuite:ProblemSuite, characterizer:Characterizer, terminationCondition:TerminationCondition, seed:int, algorithm:Algorithm, threads:int=1):
+    #If inferenceServer is true the predictions of every run are made by a single inference server process, which batches together the requests received within inferenceWindow seconds of each other, see Configurator.InferenceServer
+    def __init__(self, problemSuite:ProblemSuite, characterizer:Characterizer, terminationCondition:TerminationCondition, seed:int, algorithm:Algorithm, threads:int=1, inferenceServer:bool=False, inferenceWindow:float=0.01):
         self.problems = problemSuite 
         self.characterizer = characterizer 
         self.terminationCondition = terminationCondition
@@ -48,6 +101,64 @@ class Runner:
         self.algorithm = algorithm
         self.threads = threads
 
+        #a list of (Process, Connection) for each of our workers, started on the first call to schedule
+        self.workers = [] 
+
+        self.inferenceServer = inferenceServer
+        self.inferenceWindow = inferenceWindow
+        #the (Process, Connection) of the inference server, started with the workers 
+        self.server = None 
+
+        #the model state is written to a file in _modelDir once per call to schedule, and workers are sent the path and _modelVersion, see _writeSnapshot
+        self._modelDir = None 
+        self._modelVersion = 0 
+
+    #Starts the pool of worker processes if it is not already running 
+    def _startWorkers(self) -> None:
+        if len(self.workers) > 0:
+            return 
+
+        clients = [None for i in range(self.threads)]
+        if self.inferenceServer:
+            serverConns = [] 
+            for i in range(self.threads):
+                serverConn, clients[i] = Pipe()
+                serverConns.append(serverConn)
+            conn, serverControl = Pipe() 
+            p = Process(target=_server, args=(serverConns, serverControl, self.inferenceWindow), daemon=True)
+            p.start() 
+            serverControl.close() 
+            for x in serverConns:
+                x.close() 
+            self.server = (p, conn)
+
+        for i in range(self.threads):
+            conn, workerConn = Pipe() 
+            p = Process(target=_worker, args=(self.algorithm, workerConn, clients[i]), daemon=True) 
+            p.start() 
+            workerConn.close() 
+            if clients[i] is not None:
+                clients[i].close() 
+            self.workers.append((p, conn))
+
+    #Writes a snapshot of state for the workers (or the inference server) as name_<_modelVersion>.pkl, replacing the snapshot from the previous version. Returns the (path, version) handle passed to the workers 
+    def _writeSnapshot(self, name:str, state:object) -> Tuple[str,int]:
+        if self._modelDir is None:
+            self._modelDir = tempfile.mkdtemp(prefix="LAACModel")
+
+        path = os.path.join(self._modelDir, f"{name}_{self._modelVersion}.pkl")
+
+        #written under a temporary name, so a worker can never read a partial snapshot 
+        with open(path + ".tmp", "wb") as outF:
+            outF.write(pickle.dumps(state))
+        os.replace(path + ".tmp", path)
+
+        previous = os.path.join(self._modelDir, f"{name}_{self._modelVersion-1}.pkl")
+        if os.path.exists(previous):
+            os.remove(previous)
+
+        return path, self._modelVersion
+
     #configurations should be a list of tuples of (int,Configuration) where the int indicates how many instances should be run for the Configuration
     #runs should be a list of tuples (int,Run) Run is a previously existing Run object. Runner will perform <int> additional runs on new instances of the configuration sequence found in Run 
     #This method must produce a list of tuples (Instance, Configuration), corresponding to a problem instance and initial configuration to provide tothe algorithm 
@@ -55,7 +166,49 @@ class Runner:
         raise NotImplementedError
 
     #Performs numInstances runs each for numNewConfigs new configuration sequences and performance an additional run on a new instance for any runs in configsToReRun 
+    #Runs are returned in the order they were scheduled, once all of them have finished
     def schedule(self, numNewConfigs:int, numInstances:int, confSampler:ConfigurationGenerator, configsToReRun:List[Run] = None) -> List[Run]:
+        ret = dict()
+        for i,run in self._execute(numNewConfigs, numInstances, confSampler, configsToReRun):
+            ret[i] = run 
+
+        return [ret[i] for i in range(len(ret))] 
+
+    #As schedule, but each Run is yielded as soon as it finishes, so the caller can process results while the remaining runs are still in progress 
+    #Runs are yielded in the order they finish, which may differ between calls when threads > 1 
+    def stream(self, numNewConfigs:int, numInstances:int, confSampler:ConfigurationGenerator, configsToReRun:List[Run] = None) -> Iterator[Run]:
+        for i,run in self._execute(numNewConfigs, numInstances, confSampler, configsToReRun):
+            yield run 
+
+    #As stream, but Runs are yielded in the order they were scheduled, as lists of consecutive runs. Each list is yielded as soon as its runs, and every run scheduled before them, have finished 
+    #This lets the caller store results while later runs are still in progress, without the order the results are stored in depending on timing 
+    def streamBatches(self, numNewConfigs:int, numInstances:int, confSampler:ConfigurationGenerator, configsToReRun:List[Run] = None) -> Iterator[List[Run]]:
+        finished = dict()
+        nextRun = 0 
+        for i,run in self._execute(numNewConfigs, numInstances, confSampler, configsToReRun):
+            finished[i] = run 
+
+            batch = [] 
+            while nextRun in finished:
+                batch.append(finished.pop(nextRun))
+                nextRun += 1 
+
+            if len(batch) > 0:
+                yield batch 
+
+    #As schedule, but the workers add each Run directly to the sqlite3ConfigurationDB stored at path, marked as performed on iteration, rather than sending them back
+    #The DB must be stored on disk, so that the workers can open it 
+    #Returns once all of the runs are stored 
+    def store(self, path:str, iteration:int, numNewConfigs:int, numInstances:int, confSampler:ConfigurationGenerator, configsToReRun:List[Run] = None) -> None:
+        if path == ":memory:":
+            raise RunnerError("Workers can not write to an in memory DB")
+
+        for i,run in self._execute(numNewConfigs, numInstances, confSampler, configsToReRun, (path, iteration)):
+            pass 
+
+    #Does the work for schedule, stream, and store. Yields tuples of (int, Run) where the int is the position of the run in the schedule 
+    #store is passed on to the workers, see _worker
+    def _execute(self, numNewConfigs:int, numInstances:int, confSampler:ConfigurationGenerator, configsToReRun:List[Run] = None, store:Tuple[str,int] = None) -> Iterator[Tuple[int,Run]]:
 
         #TODO: we should check if strictConstraints is true, and if so grind out numNewConfigs valid initial configs. Otherwise validity is only checked at Algorithm. At algorithm invalid configs will be replaced with valid onces when constraints are strict, meaning attempts at repeating an invalid initial config will lead to multiple runs with different initial configs. Each new run started with the invalid config will grind out a new (possibly random) valid config. This change may effect other components, so we'll need to trace it out/test to double check.
         configs = [(numInstances, confSampler.generate()) for x in range(numNewConfigs)]
@@ -67,43 +220,101 @@ class Runner:
 
         todo = self._generateInstances(configs, reRun) 
 
-        manager = Manager() 
+        self._startWorkers() 
 
-        ret = [manager.list() for x in range(len(todo))] 
+        #the runs only generate configurations, so they receive the inference state, which avoids loading torch in the workers 
+        #the state is written once, and each worker loads it once, rather than a copy being sent with every run 
+        self._modelVersion += 1 
+        if self.server is None:
+            state = confSampler.getInferenceState()
+        else:
+            state,network = confSampler.getRemoteState()
+            if network is not None:
+                path,version = self._writeSnapshot("network", network)
+                self.server[1].send(path)
+        model = self._writeSnapshot("model", state)
 
-        samplerState = confSampler.getState()
+        todo = [(i, ((inst, conf, self.characterizer, self.terminationCondition, self.rng.randint(0,4000000000),i), model, store)) for i,(inst,conf) in enumerate(todo)]
 
-        todo = [(inst, conf, self.characterizer, deepcopy(samplerState), self.terminationCondition, self.rng.randint(0,4000000000),i) for i,(inst,conf) in enumerate(todo)]
-
-        todo = [Process(target=_algWrapper, args=(self.algorithm.run, x, ret[i]), daemon=True) for i,x in enumerate(todo)]
+        idle = [x for x in self.workers] 
         running = []
 
-        #My understanding is that a Pool uses a simple message queue to pass args into a new process, and retrieve results 
-        #the message queue attempts to pickle everything to make transmission possible, unfortunately some of what we're passing around isn't picklable 
-        #on the other hand, using Process directly just forks the current process, which should use copy on write semantics (at least on linux) avoiding the pickablility issue 
-        #and still not wasting space (despite what top may report) 
-        #I'm not confident that this will behave the same on windows however 
-        #TODO: Test this on windows eventually 
+        #Runs are handed out to idle workers one at a time, so a worker which finishes early immediately picks up more work
+        #The workers are started once and reused for every call to schedule, see _worker 
         
-        while len(todo) > 0 or len(running) > 0:
-            stillRunning = []
-            while len(running) < self.threads and len(todo) > 0:
-                x = todo.pop(0) 
-                running.append(x) 
-                x.start() 
-
-            for i,x in enumerate(running):
-                if x.is_alive():
-                    stillRunning.append(x) 
-            
-            running = stillRunning
-
-            time.sleep(0.1)
-
-        return [x.pop(0) for x in ret] 
+        finished = False 
+        try:
+            done = []
+            while len(todo) > 0 or len(running) > 0 or len(done) > 0:
+                while len(idle) > 0 and len(todo) > 0:
+                    x = idle.pop(0) 
+                    i,args = todo.pop(0)
+                    x[1].send(args)
+                    running.append((x,i)) 
+
+                #Finished runs are handed back only after idle workers have been given new work, so the workers stay busy while the caller processes results 
+                for i,run in done:
+                    yield i, run
+                done = []
+
+                if len(running) == 0:
+                    continue
+
+                #Block until at least one worker responds, or a worker dies
+                ready = wait([x[1] for x,i in running] + [x[0].sentinel for x,i in running])
+
+                stillRunning = []
+                for x,i in running:
+                    if x[1] in ready:
+                        run,err = x[1].recv() 
+                        if err is not None:
+                            raise err
+                        idle.append(x)
+                        done.append((i,run))
+                    elif x[0].sentinel in ready:
+                        raise RunnerError("A worker process exited unexpectedly")
+                    else:
+                        stillRunning.append((x,i)) 
+                
+                running = stillRunning
+
+            finished = True 
+        finally:
+            #If we stopped early, due to an error or because the caller stopped iterating, some workers may still be busy. Restart the pool so the next call starts from a clean slate
+            if not finished:
+                self.close() 
  
+    #Stops the worker processes
     def close(self) -> None:
-        self.workers.close()
+        for p,conn in self.workers:
+            if p.is_alive():
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass 
+        for p,conn in self.workers:
+            p.join(5)
+            if p.is_alive():
+                p.terminate() 
+            conn.close()
+        self.workers = [] 
+
+        if self.server is not None:
+            p,conn = self.server 
+            if p.is_alive():
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass 
+            p.join(5)
+            if p.is_alive():
+                p.terminate() 
+            conn.close() 
+            self.server = None 
+
+        if self._modelDir is not None:
+            shutil.rmtree(self._modelDir, ignore_errors=True)
+            self._modelDir = None 
 
 class RandomInstanceRunner(Runner):
     
@@ -23,12 +23,12 @@ import multiprocessing
 from Configurator.Evaluator import SimpleEvaluator
 from Configurator.ConfigurationDB import sqlite3ConfigurationDB
 from Configurator.Run import Run
-from Configurator.Runner import RandomInstanceRunner
+from Configurator.Runner import RandomInstanceRunner, Runner
 from Configurator.Characterizer import Characterizer
-from Configurator.ConfigurationGenerator import AdaptiveGenerator, RandomGenerator
+from Configurator.ConfigurationGenerator import AdaptiveGenerator, ConfigurationGenerator, RandomGenerator
 from Configurator.ProblemSuite import ProblemSuite
 from Configurator.ConfigurationDefinition import ConfigurationDefinition
-from Configurator.Algorithm import Algorithm
+from Configurator.Algorithm import Algorithm, CallableAlgorithm, PersistentAlgorithm
 from Configurator.TerminationCondition import FELimit
 import json
 import argparse
@@ -52,6 +52,22 @@ def countFEs(runs:List[Run]) -> int:
 
     return total 
 
+#Performs the runs for an iteration and adds them to configDB, returns the number of FEs consumed by the runs 
+#If workersWriteDB is true the runner's workers add their runs to configDB directly, otherwise the runs are added while later runs are still in progress, in the order they were scheduled so the DB's ids don't depend on timing 
+def performRuns(runner:Runner, configDB:sqlite3ConfigurationDB, iteration:int, numNewConfigs:int, numInstances:int, model:ConfigurationGenerator, workersWriteDB:bool) -> int:
+    if workersWriteDB:
+        runner.store(configDB.path, iteration, numNewConfigs, numInstances, model)
+        return configDB.evaluationsConsumed(iteration)
+
+    total = 0 
+    for runs in runner.streamBatches(numNewConfigs, numInstances, model):
+        for run in runs:
+            run.performedOnIteration = iteration
+        configDB.addRuns(runs)
+        total += countFEs(runs)
+
+    return total
+
 def main():
     #needed for torch, since torch is stateful
     multiprocessing.set_start_method("spawn")
@@ -114,6 +130,12 @@ def main():
     FIXEDDIMENSIONALITY = scenario["fixedDimensionality"]
     DIMENSIONALITY = scenario["dimensionality"]
     PERFORMANCECUTOFF = scenario["performanceCutOff"]
+    TARGETALGORITHMMODE = scenario["targetAlgorithmMode"]
+    WORKERSWRITEDB = scenario["workersWriteDB"]
+    INFERENCESERVER = scenario["inferenceServer"]
+
+    if WORKERSWRITEDB and WORKINMEMORY:
+        raise Exception("workersWriteDB requires workInMemory to be false.")
 
     #If the results path exists, remove it and all contained files 
     if path.exists(RESULTSPATH):
@@ -130,7 +152,14 @@ def main():
 
     rng = Random(seed)
 
-    alg = Algorithm(scenario["targetAlgorithm"], scenario["staticArgs"], scenario["strictConstraints"]==False, ALGORITHMSTORAGEPATH) 
+    if TARGETALGORITHMMODE == "process":
+        alg = Algorithm(scenario["targetAlgorithm"], scenario["staticArgs"], scenario["strictConstraints"]==False, ALGORITHMSTORAGEPATH) 
+    elif TARGETALGORITHMMODE == "server":
+        alg = PersistentAlgorithm(scenario["targetAlgorithm"], scenario["staticArgs"], scenario["strictConstraints"]==False, ALGORITHMSTORAGEPATH) 
+    elif TARGETALGORITHMMODE == "callable":
+        alg = CallableAlgorithm(scenario["targetAlgorithm"], scenario["staticArgs"], scenario["strictConstraints"]==False, ALGORITHMSTORAGEPATH) 
+    else:
+        raise Exception("Target algorithm mode not recognized.")
 
     termination = FELimit(scenario["runFELimit"])
     
@@ -169,8 +198,8 @@ def main():
     
     #model = RandomGenerator(configurationDefinition, rng.randint(0,4000000000))
     
-    runner = RandomInstanceRunner(suite, characterizer, termination, rng.randint(0,4000000000), alg, scenario["threads"]) 
-    validationRunner = RandomInstanceRunner(validationSuite, characterizer, termination, rng.randint(0,4000000000), alg, scenario["threads"])
+    runner = RandomInstanceRunner(suite, characterizer, termination, rng.randint(0,4000000000), alg, scenario["threads"], INFERENCESERVER) 
+    validationRunner = RandomInstanceRunner(validationSuite, characterizer, termination, rng.randint(0,4000000000), alg, scenario["threads"], INFERENCESERVER)
 
     if WORKINMEMORY:
         configDB = sqlite3ConfigurationDB(path=":memory:", initialize=True,seed=rng.randint(0,4000000000))
@@ -188,11 +217,7 @@ def main():
     configsPerIteration = scenario["configsPerIteration"] 
     minRunsPerConfig = scenario["minRunsPerConfig"]     
 
-    newRuns = runner.schedule(configsPerIteration, minRunsPerConfig, model) 
-    totalFEsConsumed = countFEs(newRuns)
-    for run in newRuns:
-        run.performedOnIteration = 0
-        configDB.addRun(run)
+    totalFEsConsumed = performRuns(runner, configDB, 0, configsPerIteration, minRunsPerConfig, model, WORKERSWRITEDB)
 
     start = time()
 
@@ -227,17 +252,9 @@ def main():
         print(f"Update: {tot}",file=stderr)
 
         start = time()
-        newRuns = runner.schedule(configsPerIteration, minRunsPerConfig, model)
+        totalFEsConsumed += performRuns(runner, configDB, iteration, configsPerIteration, minRunsPerConfig, model, WORKERSWRITEDB)
         tot = time() - start 
-        print(f"Schedule: {tot}",file=stderr)
-
-        start = time()
-        totalFEsConsumed += countFEs(newRuns)
-        for run in newRuns:
-            run.performedOnIteration = iteration
-            configDB.addRun(run)
-        tot = time()-start 
-        print(f"Loading DB: {tot}",file=stderr)
+        print(f"Schedule and loading DB: {tot}",file=stderr)
 
         summary = model.history()["history"][-1] 
         print(summary)
@@ -247,17 +264,17 @@ def main():
             outF.write(pickle.dumps(model.getState()))
 
         if VALIDATE:
-            validationRuns = validationRunner.schedule(VALIDATIONCONFIGS, 1, model)
+            validationFEs = performRuns(validationRunner, validationConfigDB, iteration, VALIDATIONCONFIGS, 1, model, WORKERSWRITEDB)
             if COUNTVALIDATIONFES:
-                totalFEsConsumed += countFEs(validationRuns) 
-            for run in validationRuns:
-                run.performedOnIteration = iteration
-                validationConfigDB.addRun(run) 
+                totalFEsConsumed += validationFEs 
         
         iteration += 1
 
     print("FE LIMIT PASSED")
 
+    runner.close()
+    validationRunner.close()
+
     if WORKINMEMORY: #We need to write the db from memory out to disk 
         configDB.backup(f"{DBFILE}.training.sqlite3")
         validationConfigDB.backup(f"{DBFILE}.validation.sqlite3")
@@ -1 +1 @@
-g++ -I src -Wall -Wextra -Werror -Ofast -fno-finite-math-only -march=native -fpic -shared -g -o Characterize.so src/Characterize.cpp
\ No newline at end of file
+g++ -I src -Wall -Wextra -Werror -Ofast -fno-finite-math-only -march=native -fpic -shared -g -pthread -o Characterize.so src/Characterize.cpp
\ No newline at end of file
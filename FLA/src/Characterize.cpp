@@ -3,6 +3,9 @@
 #include "Solution.cpp"
 
 #include<iostream>
+#include<atomic>
+#include<thread>
+#include<vector>
 
 //TODO: The whole FLA code base needs to be cleaned up and adapted for this project
 
@@ -202,7 +205,98 @@ void characterize_cpp(double ** solutions, double * quality, double *** state, d
 
 
 
+/*
+    The number of values written to fixed by characterize_flat, ie FDC, yDist, pairwise, FEM, grad, M and stag in the order they appear in Characteristics
+*/
+const int NUM_FIXED = 69; 
+
+/*
+    Characterizes solutions stored in flat, contiguous arrays, as produced by numpy
+    solutions is a numSolutions x dims row major array, quality has numSolutions entries 
+    state holds the solutions from every iteration stacked into one row major array with dims columns, the first stateSize[0] rows belong to iteration 0, the next stateSize[1] to iteration 1, etc.
+    stateQuality gives the quality of each row of state 
+    numStates is the length of stateSize 
+
+    fixed will be populated with the NUM_FIXED features with a fixed size
+    diversity must have room for numSolutions values, gBestStep for numSolutions - 1, and gBestStag and gBestyDist for 2*dims 
+*/
+void characterize_flat(double * solutions, double * quality, double * state, double * stateQuality, int numSolutions, int * stateSize, int numStates, int dims, double * fixed, double * diversity, double * gBestStep, double * gBestStag, double * gBestyDist, long seed) {
+
+    //characterize_cpp expects an array of pointers for each row, these point directly into the flat arrays so nothing is copied
+    double ** solutionRows = new double*[numSolutions];
+    for(int i = 0; i < numSolutions; i++) 
+        solutionRows[i] = solutions + (long)i*dims;
+
+    double *** stateRows = new double**[numStates]; 
+    double ** stateQualityRows = new double*[numStates]; 
+    long offset = 0;
+    for(int i = 0; i < numStates; i++) {
+        stateRows[i] = new double*[stateSize[i]];
+        for(int j = 0; j < stateSize[i]; j++)
+            stateRows[i][j] = state + (offset + j)*dims;
+        stateQualityRows[i] = stateQuality + offset;
+        offset += stateSize[i];
+    }
+
+    Characteristics characteristics;
+    characteristics.diversity = diversity;
+    characteristics.gBestStep = gBestStep;
+    characteristics.gBestStag = gBestStag;
+    characteristics.gBestyDist = gBestyDist;
+
+    characterize_cpp(solutionRows, quality, stateRows, stateQualityRows, numSolutions, stateSize, dims, characteristics, seed);
+
+    int loc = 0;
+    fixed[loc++] = characteristics.FDC;
+    for(int i = 0; i < 2; i++)
+        fixed[loc++] = characteristics.yDist[i];
+    for(int i = 0; i < 54; i++)
+        fixed[loc++] = characteristics.pairwise[i];
+    fixed[loc++] = characteristics.FEM;
+    for(int i = 0; i < 7; i++)
+        fixed[loc++] = characteristics.grad[i];
+    for(int i = 0; i < 2; i++)
+        fixed[loc++] = characteristics.M[i];
+    for(int i = 0; i < 2; i++)
+        fixed[loc++] = characteristics.stag[i];
+
+    for(int i = 0; i < numStates; i++)
+        delete[] stateRows[i];
+    delete[] stateRows;
+    delete[] stateQualityRows;
+    delete[] solutionRows;
+}
+
+/*
+    Characterizes a batch of numResults results, each stored in flat arrays as described for characterize_flat 
+    Every argument other than numResults and numThreads is an array holding the corresponding argument of characterize_flat for each result 
+    Results with no solutions are skipped 
+    The batch is split between numThreads threads, including the calling thread
+*/
+void characterize_many(int numResults, double ** solutions, double ** quality, double ** state, double ** stateQuality, int * numSolutions, int ** stateSize, int * numStates, int * dims, double ** fixed, double ** diversity, double ** gBestStep, double ** gBestStag, double ** gBestyDist, long * seeds, int numThreads) {
+
+    std::atomic<int> next(0);
+
+    auto work = [&]() {
+        for(int i = next++; i < numResults; i = next++) {
+            if(numSolutions[i] > 0)
+                characterize_flat(solutions[i], quality[i], state[i], stateQuality[i], numSolutions[i], stateSize[i], numStates[i], dims[i], fixed[i], diversity[i], gBestStep[i], gBestStag[i], gBestyDist[i], seeds[i]);
+        }
+    };
+
+    std::vector<std::thread> threads;
+    for(int i = 1; i < numThreads && i < numResults; i++)
+        threads.push_back(std::thread(work));
+
+    work();
+
+    for(std::thread & t : threads)
+        t.join();
+}
+
 extern "C" {
-    void characterize(double ** solutions, double * quality, double *** state, double ** stateQuality, int numSolutions, int * stateSize, int dims, Characteristics & characteristics, long seed){ return characterize_cpp(solutions, quality, state, stateQuality, numSolutions, stateSize, dims, characteristics, seed); }
+    void characterizeFlat(double * solutions, double * quality, double * state, double * stateQuality, int numSolutions, int * stateSize, int numStates, int dims, double * fixed, double * diversity, double * gBestStep, double * gBestStag, double * gBestyDist, long seed){ return characterize_flat(solutions, quality, state, stateQuality, numSolutions, stateSize, numStates, dims, fixed, diversity, gBestStep, gBestStag, gBestyDist, seed); }
+
+    void characterizeMany(int numResults, double ** solutions, double ** quality, double ** state, double ** stateQuality, int * numSolutions, int ** stateSize, int * numStates, int * dims, double ** fixed, double ** diversity, double ** gBestStep, double ** gBestStag, double ** gBestyDist, long * seeds, int numThreads){ return characterize_many(numResults, solutions, quality, state, stateQuality, numSolutions, stateSize, numStates, dims, fixed, diversity, gBestStep, gBestStag, gBestyDist, seeds, numThreads); }
 }
 
@@ -24,7 +24,9 @@ from math import sin, sqrt
 from random import random,seed,gauss,randint
 import argparse
 from time import time 
+from typing import List
 import json 
+import sys 
 
 RANGE = 10
 
@@ -63,7 +65,8 @@ def parseList(x):
     x = x[1:-1] #remove [ and ] from start and end of string  
     x = [float(v) for v in x.split(",")]
     return x 
-if __name__ == "__main__":
+#Runs the random search with the provided command line arguments (excluding the program name) and returns the result dict 
+def randomSearch(argv:List[str]) -> dict:
     parser = argparse.ArgumentParser(description='Run a simple random search.')
     parser.add_argument("-stepSizes", action="store", nargs='?', type=parseList, default=None , help="Distribution parameters used to generate steps for each problem dimension", dest="stepSizes")
     parser.add_argument("-d", action="store", nargs='?', default=5, type=int, help="The number of dimensions to run on.", dest="dimensionality")
@@ -76,8 +79,9 @@ if __name__ == "__main__":
     parser.add_argument("-shift", action="store", nargs='?', default=True, type=bool, help="Shift the function?", dest="shift", choices=[True,False])
     parser.add_argument("-rotate", action="store", nargs='?', default=True, type=bool, help="Rotate the function?", dest="rotate", choices=[True,False])
     parser.add_argument("-g", action="store", nargs='?', default=True, type=bool, help="Only update the current solution if the new one is better?", dest="greedy", choices=[True, False])
+    parser.add_argument("-resultsFile", action="store", nargs='?', default=None, type=str, help="Write solutions and state to this .npz file instead of including them in the JSON output", dest="resultsFile")
 
-    args = parser.parse_args() 
+    args = parser.parse_args(argv) 
 
     STEPS = [[0,1] for x in range(args.dimensionality)]
     if args.stepSizes is not None:
@@ -170,14 +174,26 @@ if __name__ == "__main__":
     totalTime = time() - startTime 
 
     result = dict() 
-    #solutions is just a list of dicts defining each produced solution and it's quality
-    result["solutions"] = solutions
+    if args.resultsFile is not None:
+        #the same information as solutions and state below, written as arrays to an .npz file, see SolutionArrays in Configurator/Characterizer.py
+        import numpy as np 
+        with open(args.resultsFile, 'wb') as outF:
+            np.savez(outF, 
+                solutions=np.array([x["solution"] for x in solutions], dtype=np.float64).reshape((len(solutions), args.dimensionality)), 
+                quality=np.array([x["quality"] for x in solutions], dtype=np.float64), 
+                state=np.array([x["solution"] for st in state for x in st], dtype=np.float64).reshape((-1, args.dimensionality)), 
+                stateQuality=np.array([x["quality"] for st in state for x in st], dtype=np.float64), 
+                stateSizes=np.array([len(st) for st in state], dtype=np.intc))
+        result["resultsFile"] = args.resultsFile 
+    else:
+        #solutions is just a list of dicts defining each produced solution and it's quality
+        result["solutions"] = solutions
+        #a list of lists of dictionaries defining the potential solutions considered at each iteration along with their qualities 
+        result["state"] = state
+
     #the total number of function evaluations consumed in this execution 
     result["evaluationsConsumed"] = evals 
 
-    #a list of lists of dictionaries defining the potential solutions considered at each iteration along with their qualities 
-    result["state"] = state
-
     #algorithm state should be a string that can be passed as flags to the algorithm to "pick up" where this run left off 
     #problem/instance information does not need to be included LAAC will provide that on its own 
     restore = ",".join([str(v) for v in solution])
@@ -186,4 +202,7 @@ if __name__ == "__main__":
     #time used by the run
     result["time"] = totalTime
 
-    print(json.dumps(result))
\ No newline at end of file
+    return result
+
+if __name__ == "__main__":
+    print(json.dumps(randomSearch(sys.argv[1:])))
\ No newline at end of file
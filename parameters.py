@@ -74,7 +74,8 @@ problems =  {   "problems":
 #Configurations 
 parameters =    {   #Each parameter to tune needs a definition in the paremters list 
                     #All definitions need a name, type, flag, and default 
-                    #real and integer parameters need a lower and upper 
+                    #real and integer parameters need a lower and upper, integer bounds must be within -2**53 and 2**53
+                    #real values are always passed to the target algorithm formatted as floats, ex a default of 1 is passed as 1.0
                     #categorical parameters need a list of options
                     "parameters":    
                     [
@@ -452,12 +453,15 @@ scenario =  {
                                 "minRunsPerConfig":1,                           #The minimum number of runs to consider when evaluating a configuration 
                                 "maxRunsPerConfig":30,                          #The maximum number of runs to consider when evaluating a configuration. Currently unused, though may become relevent in future updates to the Evaluator
                                 "targetAlgorithm":"python3 target-algorithm.py", #The call to run the target algorithm 
+                                "targetAlgorithmMode":"process",                #How the target algorithm is run. <process, server, or callable> process starts the target algorithm once for every configuration of every run, server starts it once per thread and sends it requests over stdin, callable calls a python function directly and expects targetAlgorithm to be "module:function" ex "target-algorithm:execute". See target-algorithm.py
                                 "staticArgs":"-d 20",                            #Arguments to be provided to every algorithm call, constant settings  
                                 "strictConstraints": False,                     #Influences how strictly constraint expressions in the parameter definition are enforced
                                 "configsPerIteration":32,                       #The initial number of configurations to test per iteration of LAAC
                                 "threads":4,                                    #Threads to use for algorithm evaluations
                                 "dbfile":"resultsdb",                           #The file where tested configurations and their quality will be stored. 
                                 "workInMemory":True,                            #If true results will be kept in memory at runtime, and written to disk at the end of the run
+                                "workersWriteDB":False,                         #If true each worker process writes its runs directly to the DB file as they finish, rather than sending them back to the main process. Requires workInMemory to be false
+                                "inferenceServer":False,                        #If true the model's predictions for every run are made by a single server process, which batches together requests from concurrent runs, rather than by each run loading its own copy of the model
                                 "modelHistory":"modelHistory.json",             #A summary of the underlying model's performance
                                 "modelStoragePath":"models/",                   #A path at which to store model checkpoints
                                 "resultsStoragePath":"results/",                #Output from LAAC will be written under this path, existing content will be deleted 
@@ -486,9 +490,11 @@ algorithm = {   #Defines an algorithm, a combination of an underlying optimizer
                 "repetitionsPerRun": 5,                        #The number of runs to perform for each specific initial config 
                 "blindRunsPerProblem":30,                      #The number of blind runs per problem, some blind runs may use the same initial config 
                 "targetAlgorithm":"python3 target-algorithm.py",#The call to run the target algorithm 
+                "targetAlgorithmMode":"process",                #How the target algorithm is run. <process, server, or callable> should match what the target algorithm supports 
                 "staticArgs":"-d 20",                           #Arguments to be provided to every algorithm call, constant settings  
                 "strictConstraints": False,                     #Should match what was used during training 
                 "threads":4,                                    #Threads to use for algorithm evaluations
+                "inferenceServer":False,                        #If true the model's predictions for every run are made by a single server process, which batches together requests from concurrent runs, rather than by each run loading its own copy of the model
                 "dbfile":"resultsdb",                           #The file where tested configurations and their quality will be stored. 
                 "workInMemory":True,                            #If true results will be kept in memory at runtime, and written to disk at the end of the run
                 "resultsStoragePath":"results/",                #Output from LAAC will be written under this path, existing content will be deleted
@@ -21,6 +21,9 @@ This file should act as a wrapper to the algorithm to configure. For demonstrati
 """
 
 from subprocess import Popen, PIPE 
+from typing import List
+import json
+import os
 import sys 
 import re 
 
@@ -33,58 +36,97 @@ import re
 #in our case, random search expects means and stds for the sampling distributions to be passed as a single argument, but LAAC will provide each separately
 #so we parse those arguments here and reformat them 
 
-if len(sys.argv) > 4:
-    means = [] 
-    stds = [] 
-    others = []
-    #extract the args to reformat, set asside the rest 
-    for i in range(4, len(sys.argv), 2):
-        if re.match("-m\d+",sys.argv[i]) is not None:
-            means.append((sys.argv[i], sys.argv[i+1]))
-        
-        elif re.match("-s\d+",sys.argv[i]) is not None:
-            stds.append((sys.argv[i], sys.argv[i+1]))
-       
-        else:
-            others.append(sys.argv[i])
-            if i + 1 < len(sys.argv):
-                others.append(sys.argv[i+1])
-
-    #reformat the mean and std args into a single string
-    sorted(means)
-    sorted(stds)
-
-    values = ["{0},{1}".format(m[1],s[1]) for m,s in zip(means,stds)]
-    stepSizes = "-stepSizes [{0}]".format(",".join(values)) 
-
-    #finally construct the arg string 
-
-    args = " ".join(others) 
-
-    args = "{0} {1} ".format(args, stepSizes)
-
-else:
-    args = ""
-
-cmd = "python3 RandomSearch/python/randomSearch.py {0}-aSeed {1}".format(args, sys.argv[2]) 
-
-print(cmd)
-
-io = Popen(cmd.split(" "), stdout=PIPE, stderr=PIPE)
-
-#wait for the process to finish 
-_stdout,_stderr = io.communicate() 
-
-#here you would do any error checking or validation you need
-#then reformat the target algorithms output to the JSON required by LAAC 
-
-#randomsearch already produces the JSON we need, so we just print it
-print("RESULTS FOLLOW") #LAAC will interpret everything after the line RESULTS FOLLOW as the algorithm output 
-print(_stdout.decode()) 
-
-err = _stderr.decode() #usefull if you have issues
-if err.strip() != "":
-    print(err) 
-
-#If you're having issues the first place to check would be the output on stderr
-#print(_stderr.decode()) 
\ No newline at end of file
+#argv is the list of arguments provided by LAAC, ie sys.argv[1:]. Produces the argument string for the random search
+def buildArgs(argv:List[str]) -> str:
+    if len(argv) > 3:
+        means = [] 
+        stds = [] 
+        others = []
+        #extract the args to reformat, set asside the rest 
+        for i in range(3, len(argv), 2):
+            if re.match("-m\d+",argv[i]) is not None:
+                means.append((argv[i], argv[i+1]))
+            
+            elif re.match("-s\d+",argv[i]) is not None:
+                stds.append((argv[i], argv[i+1]))
+           
+            #LAAC can read solutions and state from a binary file rather than from the JSON output, which is much faster for long runs 
+            #each execution gets its own file in the storage path, named by thread and seed, so the files of earlier steps are not overwritten when LAAC keeps the solutions 
+            elif argv[i] == "-binaryResults":
+                if argv[i+1] == "True":
+                    others.append("-resultsFile")
+                    others.append(os.path.join(argv[2], "results_{0}_{1}.npz".format(argv[0], argv[1])))
+
+            else:
+                others.append(argv[i])
+                if i + 1 < len(argv):
+                    others.append(argv[i+1])
+
+        #reformat the mean and std args into a single string
+        sorted(means)
+        sorted(stds)
+
+        values = ["{0},{1}".format(m[1],s[1]) for m,s in zip(means,stds)]
+        stepSizes = "-stepSizes [{0}]".format(",".join(values)) 
+
+        #finally construct the arg string 
+
+        args = " ".join(others) 
+
+        args = "{0} {1} ".format(args, stepSizes)
+
+    else:
+        args = ""
+
+    return "{0}-aSeed {1}".format(args, argv[1])
+
+#When the target algorithm is written in python LAAC can call it directly, see CallableAlgorithm in Configurator/Algorithm.py 
+#argv is the list of arguments which would otherwise be found in sys.argv[1:], and the result dict is returned rather than printed 
+#Since we're already running in a python process, we skip starting a second interpreter for the random search and call it directly 
+def execute(argv:List[str]) -> dict:
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "RandomSearch", "python")
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    from randomSearch import randomSearch
+
+    return randomSearch(buildArgs(argv).split(" "))
+
+#LAAC can also run the target algorithm as a long lived server, see PersistentAlgorithm in Configurator/Algorithm.py 
+#Each line on stdin is a JSON list of the arguments which would otherwise be found in sys.argv[1:], and each response is a line "RESULTS FOLLOW <n>" followed by n bytes of JSON 
+def serve() -> None:
+    for line in sys.stdin:
+        argv = json.loads(line) 
+        result = json.dumps(execute(argv)).encode()
+
+        sys.stdout.write("RESULTS FOLLOW {0}\n".format(len(result)))
+        sys.stdout.flush()
+        sys.stdout.buffer.write(result)
+        sys.stdout.buffer.flush()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "-server":
+        serve() 
+        sys.exit(0)
+
+    cmd = "python3 RandomSearch/python/randomSearch.py {0}".format(buildArgs(sys.argv[1:])) 
+
+    print(cmd)
+
+    io = Popen(cmd.split(" "), stdout=PIPE, stderr=PIPE)
+
+    #wait for the process to finish 
+    _stdout,_stderr = io.communicate() 
+
+    #here you would do any error checking or validation you need
+    #then reformat the target algorithms output to the JSON required by LAAC 
+
+    #randomsearch already produces the JSON we need, so we just print it
+    print("RESULTS FOLLOW") #LAAC will interpret everything after the line RESULTS FOLLOW as the algorithm output 
+    print(_stdout.decode()) 
+
+    err = _stderr.decode() #usefull if you have issues
+    if err.strip() != "":
+        print(err) 
+
+    #If you're having issues the first place to check would be the output on stderr
+    #print(_stderr.decode())
@@ -76,7 +76,6 @@ def getPopulatedConfigDB(seed:int) -> Tuple[List[Run],ConfigurationDB]:
     confDB = sqlite3ConfigurationDB(initialize=True,seed=12345)
     
 
-    for run in runs:
-        confDB.addRun(run) 
+    confDB.addRuns(runs) 
 
     return runs, confDB 
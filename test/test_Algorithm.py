@@ -19,17 +19,19 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 import json
 from json.decoder import JSONDecodeError
 from math import isfinite
+import os
 from subprocess import PIPE, Popen
 from test.helper import compareFeatures
 from Configurator.ConfigurationGenerator import RandomGenerator
 from Configurator.TerminationCondition import FELimit
 from Configurator.ConfigurationDefinition import Configuration
-from Configurator.Characterizer import Characterizer
+from Configurator.Characterizer import Characterizer, SolutionArrays
 from random import Random
+from tempfile import TemporaryDirectory
 from test.initializer import getConfigDef, getProblemSuite
 import unittest
 
-from Configurator.Algorithm import Algorithm
+from Configurator.Algorithm import Algorithm, CallableAlgorithm, PersistentAlgorithm
 
 """
 Sanity checks for Algorithm
@@ -102,4 +104,61 @@ class TestAlgorithm(unittest.TestCase):
  
             compareFeatures(self, conf.features, features)
 
-            
\ No newline at end of file
+    #Checks that alg2 produces the same runs as the default subprocess implementation
+    def _compareToSubprocess(self, alg2:Algorithm):
+        alg1 = Algorithm("python3 target-algorithm.py","-d 5", True) 
+
+        conf1 = Configuration(self.configurationDefinition, self.vals)
+        conf2 = Configuration(self.configurationDefinition, self.vals)
+
+        model1 = RandomGenerator(self.configurationDefinition, self.seed)
+        model2 = RandomGenerator(self.configurationDefinition, self.seed)
+
+        out1 = alg1.run(self.instance, conf1, self.characterizer, model1.getState(), self.condition, self.seed,0,deleteSols=False) 
+        out2 = alg2.run(self.instance, conf2, self.characterizer, model2.getState(), self.condition, self.seed,0,deleteSols=False) 
+        alg2.close()
+
+        self.assertEqual(len(out1.configurations), len(out2.configurations), "Both runs should use the same number of configurations.")
+
+        for c1,c2 in zip(out1.configurations, out2.configurations):
+            c1.rawResult["time"] = 0 
+            c2.rawResult["time"] = 0 
+            self.assertEqual(c1.rawResult, c2.rawResult, "Both implementations should produce the same results.") 
+            compareFeatures(self, c1.features, c2.features)
+
+    def testPersistentAlgorithm(self):
+        self._compareToSubprocess(PersistentAlgorithm("python3 target-algorithm.py","-d 5", True))
+
+    def testCallableAlgorithm(self):
+        self._compareToSubprocess(CallableAlgorithm("target-algorithm:execute","-d 5", True))
+
+    def testBinaryResults(self):
+        alg1 = Algorithm("python3 target-algorithm.py","-d 5", True) 
+
+        with TemporaryDirectory() as path:
+            alg2 = Algorithm("python3 target-algorithm.py","-d 5 -binaryResults True", True, path) 
+
+            conf1 = Configuration(self.configurationDefinition, self.vals)
+            conf2 = Configuration(self.configurationDefinition, self.vals)
+
+            model1 = RandomGenerator(self.configurationDefinition, self.seed)
+            model2 = RandomGenerator(self.configurationDefinition, self.seed)
+
+            out1 = alg1.run(self.instance, conf1, self.characterizer, model1.getState(), self.condition, self.seed,0) 
+            out2 = alg2.run(self.instance, conf2, self.characterizer, model2.getState(), self.condition, self.seed,0) 
+
+            self.assertEqual(len(out1.configurations), len(out2.configurations), "Both runs should use the same number of configurations.")
+
+            for c1,c2 in zip(out1.configurations, out2.configurations):
+                self.assertEqual(c1.quality, c2.quality, "Binary results should give the same quality.") 
+                self.assertNotIn("resultsFile", c2.rawResult, "The results file should be removed along with the solutions.")
+                compareFeatures(self, c1.features, c2.features)
+
+            #when the solutions are kept, every step should keep its own results file 
+            model3 = RandomGenerator(self.configurationDefinition, self.seed)
+            out3 = alg2.run(self.instance, Configuration(self.configurationDefinition, self.vals), self.characterizer, model3.getState(), self.condition, self.seed, 0, False)
+            files = [c.rawResult["resultsFile"] for c in out3.configurations]
+            self.assertEqual(len(set(files)), len(files), "Each step should write a different results file.")
+            for c,f in zip(out3.configurations, files):
+                self.assertTrue(os.path.exists(f), "The results file of every step should be kept.")
+                self.assertEqual(float(SolutionArrays.load(f).quality[-1]), c.quality, "Each results file should hold the solutions of its own step.")
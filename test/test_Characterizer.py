@@ -19,8 +19,11 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 from test.helper import compareFeatures
 import unittest
 from random import Random
+from math import isnan
 
-from Configurator.Characterizer import Characterizer
+from Configurator.Characterizer import Characterizer, SolutionArrays
+from tempfile import TemporaryDirectory
+import os
 
 """
 Sanity checks for our Characterizer
@@ -59,3 +62,41 @@ class TestCharacterizer(unittest.TestCase):
             compareFeatures(self, a, b)
 
             
+
+    def testSolutionArrays(self):
+        result = dict() 
+        result["solutions"] = [self.rndSol() for x in range(50)]
+        result["state"] = [
+                [self.rndSol() for x in range(self.rng.randint(1,20))] for y in range(50)
+            ]
+
+        arrays = SolutionArrays.fromResults(result)
+        with TemporaryDirectory() as path:
+            arrays.save(os.path.join(path, "results.npz"))
+            loaded = SolutionArrays.load(os.path.join(path, "results.npz"))
+
+        a = Characterizer().characterize(result, self.seed)
+        b = Characterizer().characterize(loaded, self.seed)
+
+        compareFeatures(self, a, b)
+
+    def testCharacterizeMany(self):
+        results = [] 
+        for i in range(10):
+            result = dict() 
+            result["solutions"] = [self.rndSol() for x in range(50)]
+            result["state"] = [
+                    [self.rndSol() for x in range(10)] for y in range(50)
+                ]
+            results.append(result)
+        results.append({"solutions":[], "state":[]})
+
+        seeds = [self.rng.randint(0,4000000000) for x in results]
+
+        features = Characterizer().characterizeMany(results, seeds, 4)
+
+        self.assertEqual(features.shape, (len(results), Characterizer().featureSize()), "There should be one row of features per result.")
+        self.assertTrue(all(isnan(x) for x in features[-1]), "Empty results should produce a row of NaNs.")
+
+        for result,seed,row in zip(results[:-1], seeds[:-1], features[:-1]):
+            compareFeatures(self, Characterizer().characterize(result, seed), row)
@@ -17,6 +17,8 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 from test.initializer import getPopulatedConfigDB
+from Configurator.ConfigurationDB import sqlite3ConfigurationDB
+from Configurator.Problem import Instance
 import unittest
 
 """
@@ -65,3 +67,118 @@ class TestConfigurationDB(unittest.TestCase):
 
                 
 
+
+    def testStoredRuns(self):
+        runs,db = getPopulatedConfigDB(self.seed)
+
+        for prob in db.problemGenerator():
+            for rcrd in prob:
+                rcrd.desirable(True)
+
+        loaded = db.getDesirables()
+
+        self.assertEqual(len(loaded), len(runs), "Every run should be loaded.")
+
+        for run1,run2 in zip(runs, loaded):
+            self.assertEqual(run1.instance, run2.instance, "Runs should be on the same instance.")
+            self.assertEqual(run1.performedAt, run2.performedAt, "Runs should be performed at the same time.")
+            self.assertEqual(run1.quality(), run2.quality(), "Runs should have the same quality.")
+            self.assertEqual(len(run1.configurations), len(run2.configurations), "Runs should have the same number of configurations.")
+
+            for c1,c2 in zip(run1.configurations, run2.configurations):
+                self.assertEqual(c1.toFlags(), c2.toFlags(), "Configurations should have the same parameters.")
+                self.assertTrue((c1.features == c2.features).all(), "Configurations should have the same features.")
+                self.assertEqual(c1.rawResult, c2.rawResult, "Configurations should have the same raw result.")
+
+    def testAddRuns(self):
+        runs,db = getPopulatedConfigDB(self.seed)
+
+        db2 = sqlite3ConfigurationDB(initialize=True,seed=self.seed)
+        for run in runs:
+            db2.addRun(run)
+
+        for table in ["records", "runs", "configurations"]:
+            query = "SELECT * FROM {} ORDER BY 1,2".format(table)
+            rows1 = [x for x in db.db.execute(query)]
+            rows2 = [x for x in db2.db.execute(query)]
+
+            #modified times will differ
+            if table == "records":
+                rows1 = [x[:-1] for x in rows1]
+                rows2 = [x[:-1] for x in rows2]
+
+            self.assertEqual(rows1, rows2, "Adding runs one at a time or in a batch should produce the same {} table.".format(table))
+
+    def testSetFlags(self):
+        runs,db = getPopulatedConfigDB(self.seed)
+
+        ids = [x.id() for x in db.recordGenerator()]
+
+        db.setDesirable(ids, True)
+        db.setReRun(ids[:1], True)
+
+        for rcrd in db.recordGenerator():
+            self.assertTrue(rcrd.desirable(), "Every record should be desirable.")
+            self.assertEqual(rcrd.reRun(), rcrd.id() == ids[0], "Only the first record should need a reRun.")
+
+        self.assertEqual(len(db.getDesirables()), len(runs), "Every run should be desirable.")
+
+    def testIndexes(self):
+        runs,db = getPopulatedConfigDB(self.seed)
+
+        indexes = {name:table for name,table in db.db.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")}
+        self.assertEqual(indexes, {"recordsConfigProblem":"records", "recordsModified":"records", "recordsDesirable":"records", "runsRecord":"runs"}, "Every index should be created.")
+
+        #the lookups made for every insert, record, and evaluator update should search an index rather than scan the table 
+        lookups = [
+            ("SELECT id FROM records WHERE config = ? AND problem = ?", (0, 0), "recordsConfigProblem"),
+            ("SELECT id FROM records WHERE modified >= ?", (0,), "recordsModified"),
+            ("SELECT id FROM runs WHERE record = ?", (0,), "runsRecord")
+        ]
+        for query,params,index in lookups:
+            plan = " ".join(row[-1] for row in db.db.execute("EXPLAIN QUERY PLAN " + query, params))
+            self.assertIn(index, plan, "{0} should use {1}".format(query, index))
+            self.assertNotIn("SCAN", plan, "{0} should not scan the table".format(query))
+
+        #values are bound rather than formatted into the statements, so flags containing quotes are stored and found 
+        run = runs[0]
+        run.instance = Instance.fromFlags("-problem 'quoted\"", run.instance.flags)
+        db.addRun(run)
+        found = [x for x in db.recordGenerator() if x.problem() == run.problem()]
+        self.assertEqual(len(found), 1, "The run should have its own record.")
+        self.assertEqual([x.instance.problem for x in found[0].getRuns()], [run.instance.problem], "The run should be found by its record.")
+
+    def testDesirableProjections(self):
+        runs,db = getPopulatedConfigDB(self.seed)
+
+        self.assertEqual(db.getDesirables(10), [], "No records are desirable yet.")
+
+        db.setDesirable([x.id() for x in db.recordGenerator()], True)
+
+        self.assertEqual(db.getDesirables(0), [], "An empty sample should produce no runs.")
+
+        #the sample should be reproducible from the seed 
+        _,db2 = getPopulatedConfigDB(self.seed)
+        db2.setDesirable([x.id() for x in db2.recordGenerator()], True)
+        for _ in range(5):
+            self.assertEqual([x.instance.problem for x in db.getDesirables(1)], [x.instance.problem for x in db2.getDesirables(1)], "The same seed should produce the same samples.")
+
+        self.assertEqual(len(db.getDesirableSummaries(1)), 100, "Sampling one record should produce its 100 runs.")
+        self.assertFalse(db.db.in_transaction, "Sampling should not write to the DB.")
+
+        ids, features, targets = db.getTrainingData([x.id() for x in db.recordGenerator()])
+        summaries = db.getDesirableSummaries()
+
+        i = 0
+        for run, summary in zip(runs, summaries):
+            self.assertEqual(summary["problem"], run.instance.problem, "Summaries should have the problem of the run.")
+            self.assertEqual(summary["quality"], run.quality(), "Summaries should have the quality of the run.")
+            self.assertEqual(summary["initialConfiguration"], run.configurations[0].toDict(), "Summaries should have the initial configuration of the run.")
+            self.assertEqual(sum(summary["generationMethods"].values()), len(run.configurations), "Summaries should count every configuration of the run.")
+
+            for prev,conf in zip(run.configurations[:-1], run.configurations[1:]):
+                self.assertTrue((features[i] == prev.features).all(), "Examples should have the features of the previous configuration.")
+                self.assertEqual(targets[i], {x:conf.values[x].value for x in conf.values}, "Examples should target the next configuration.")
+                i += 1 
+
+        self.assertEqual(i, len(features), "Every pair of consecutive configurations should produce an example.")
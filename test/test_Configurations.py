@@ -17,8 +17,10 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 from test.initializer import getConfigDef
+import pickle
 import unittest
-from Configurator.ConfigurationDefinition import Real, Integer, Categorical, ConcreteParameter, Configuration, MissingParameterError
+import numpy as np
+from Configurator.ConfigurationDefinition import ConfigurationDefinition, Real, Integer, Categorical, ConcreteParameter, Configuration, MissingParameterError
 
 """
 Sanity checks for ConfigurationDefinition, Configuration, and the supporting classes 
@@ -87,6 +89,9 @@ class TestConfigurations(unittest.TestCase):
         except ValueError as e:
             pass
 
+        with self.assertRaises(ValueError, msg="Value error should be thrown for bounds which can't be stored exactly"):
+            Integer("v1", "integer", "-v1", 1, 0, 2**53 + 1)
+
         self.assertTrue(r.validate(1), "0.25 should be a valid value") 
 
         self.assertFalse(r.validate(-1), "-0.25 should not be a valid value") 
@@ -285,9 +290,146 @@ class TestConfigurations(unittest.TestCase):
 
         
 
+    def testCompactValues(self):
+        confDef = self.configurationDefinition
+        vals =  {
+                    "iterations":50,
+                    "samples":4,
+                    "mean1":0.25,
+                    "std1":1.0,
+                    "mean2":0.5,
+                    "std2":1.0,
+                    "mean3":0.0,
+                    "std3":1.0,
+                    "mean4":0.0,
+                    "std4":1.0,
+                    "mean5":0.0,
+                    "std5":1.0,
+                    "greedy":"False"
+                }
 
+        conf = Configuration(confDef, vals)
 
-
-
-
-
+        #values keep their types, and dict style access is preserved
+        self.assertEqual(conf.toDict(), vals, "toDict should reproduce the values the configuration was created from")
+        self.assertEqual(conf["iterations"], 50)
+        self.assertTrue(type(conf["iterations"]) == int, "Integer parameters should be returned as ints")
+        self.assertEqual(conf["greedy"], "False")
+        self.assertEqual({x:conf.values[x].value for x in conf.values}, vals, "values should still map names to concrete parameters")
+        self.assertEqual(conf.values["mean1"].toFlags(), "-m1 0.25")
+
+        #reals are always formatted as floats 
+        vals["mean1"] = 0
+        self.assertIn("-m1 0.0", Configuration(confDef, vals).toFlags())
+        vals["mean1"] = 0.25
+
+        with self.assertRaises(AttributeError):
+            conf.somethingElse = 1
+
+        conf.features = [1.0, 2.0]
+        conf.lazyRawResult(lambda: {"solution":[]})
+        copy = pickle.loads(pickle.dumps(conf))
+        self.assertEqual(copy.toDict(), vals)
+        self.assertEqual(copy.features, [1.0, 2.0])
+        self.assertEqual(copy.rawResult, {"solution":[]}, "the rawResult should be loaded before pickling")
+        self.assertEqual(copy.toFlags(), conf.toFlags())
+
+        #definitions pickled before the index existed rebuild it 
+        old = pickle.loads(pickle.dumps(confDef))
+        del old.index
+        old.__setstate__(dict(old.__dict__))
+        self.assertEqual(old.index, confDef.index)
+
+        dup = conf.duplicateParams()
+        self.assertEqual(dup.toDict(), vals)
+        self.assertTrue(dup.valid)
+        self.assertTrue(dup.features is None and dup.rawResult is None, "duplicateParams should only copy the parameters")
+
+        vals["greedy"] = "maybe"
+        with self.assertRaises(ValueError):
+            Configuration(confDef, vals)
+
+    def testConstraints(self):
+        confDef = ConfigurationDefinition({
+            "parameters":[
+                {"name":"x", "type":"real", "flag":"-x", "default":0.5, "lower":0.0, "upper":2.0},
+                {"name":"x2", "type":"integer", "flag":"-x2", "default":1, "lower":0, "upper":10},
+                {"name":"greedy", "type":"categorical", "flag":"-g", "default":"True", "options":["True","False"]}
+            ],
+            "constraints":[
+                "$x2 > $x",                 #$x must not be substituted into $x2 
+                "0 <= $x < $x2 <= 5",       #every comparison in a chain is tested
+                "($x > 0.1) and ($x < 1.9) and ($greedy == True)"   #every operand of a boolean operator is tested
+            ]
+        })
+
+        candidates = [
+            {"x":0.5, "x2":1, "greedy":"True"},
+            {"x":1.5, "x2":1, "greedy":"True"},
+            {"x":0.5, "x2":6, "greedy":"True"},
+            {"x":0.05, "x2":1, "greedy":"True"},
+            {"x":0.5, "x2":1, "greedy":"False"}
+        ]
+        expected = [True, False, False, False, False]
+
+        self.assertEqual([Configuration(confDef, x).valid for x in candidates], expected)
+        self.assertEqual(confDef.validateBatch(confDef.columns(candidates)).tolist(), expected, "validateBatch should agree with the constraints tested one configuration at a time")
+
+        #the constraints of the example definition 
+        rng = np.random.default_rng(1)
+        candidates = [] 
+        for i in range(200):
+            vals = {x.name:x.default for x in self.configurationDefinition.parameters}
+            for name in ["mean1", "mean2", "mean3", "mean4", "std3", "std4", "std5"]:
+                vals[name] = float(rng.choice([0.1, 0.5, 1.0, 0.1 + rng.random()*0.9]))
+            candidates.append(vals)
+
+        valid = self.configurationDefinition.validateBatch(self.configurationDefinition.columns(candidates))
+        self.assertEqual(valid.tolist(), [Configuration(self.configurationDefinition, x).valid for x in candidates])
+        self.assertTrue(valid.any() and not valid.all())
+
+        #evaluations which divide by zero, overflow, or produce complex or non-finite values fail the constraint, whether tested alone or in a batch
+        confDef = ConfigurationDefinition({
+            "parameters":[
+                {"name":"x", "type":"real", "flag":"-x", "default":0.5, "lower":-2.0, "upper":2.0},
+                {"name":"y", "type":"real", "flag":"-y", "default":0.5, "lower":-2.0, "upper":2.0}
+            ],
+            "constraints":[
+                "1/$x > -100",
+                "$y**0.5 >= 0",
+                "(10**($x*200)) != 0"
+            ]
+        })
+
+        candidates = [
+            {"x":0.5, "y":1.0},
+            {"x":0.0, "y":1.0},
+            {"x":0.5, "y":-1.0},
+            {"x":1.9, "y":1.0},
+            {"x":-0.5, "y":0.0}
+        ]
+        expected = [True, False, False, False, True]
+
+        self.assertEqual([Configuration(confDef, x).valid for x in candidates], expected)
+        self.assertEqual(confDef.validateBatch(confDef.columns(candidates)).tolist(), expected, "validateBatch should agree with test when evaluation fails")
+        self.assertEqual(confDef.validateBatch(confDef.columns(candidates[:1])).tolist(), [True])
+
+        #categorical options which are literals and options which are plain strings 
+        confDef = ConfigurationDefinition({
+            "parameters":[
+                {"name":"g", "type":"categorical", "flag":"-g", "default":"True", "options":["True","abc"]}
+            ],
+            "constraints":[
+                "$g == True"
+            ]
+        })
+
+        candidates = [{"g":"True"}, {"g":"abc"}]
+        self.assertEqual([Configuration(confDef, x).valid for x in candidates], [True, False])
+        self.assertEqual(confDef.validateBatch(confDef.columns(candidates)).tolist(), [True, False], "validateBatch should agree with test for mixed categorical options")
+
+        with self.assertRaises(ValueError):
+            ConfigurationDefinition({"parameters":[], "constraints":["$missing > 1"]})
+
+        with self.assertRaises(ValueError):
+            ConfigurationDefinition({"parameters":[], "constraints":["__import__('os') == 1"]})
@@ -17,7 +17,9 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 from copy import deepcopy
-from Configurator.Model import LatinHyperCube, Model, NeuralNetwork
+from Configurator.ConfigurationGenerator import AdaptiveGenerator, initModel
+from Configurator.Model import LatinHyperCube, Model, ModelError, NumpyNetwork
+from Configurator.NeuralNetwork import NeuralNetwork
 from random import Random
 
 import numpy as np
@@ -87,4 +89,113 @@ class TestModel(unittest.TestCase):
         model3.load(deepcopy(model1.state()))
         
         self._isRepeatable(159, model1, model3)
-  
\ No newline at end of file
+  
+    def testTrainingBuffer(self):
+        model = NeuralNetwork(159, self.configDef, self.seed, True) 
+
+        ids = [x.id() for x in self.configDB.recordGenerator()]
+
+        model._refreshExamples(self.configDB)
+        self.assertEqual(sorted(model._examples), ids, "Every desirable record should be buffered.")
+
+        _, features, targets = self.configDB.getTrainingData(ids)
+        self.assertTrue((np.concatenate([model._examples[x][0] for x in ids]) == features).all(), "The buffer should hold the features of every example.")
+        for buffered,encoded in zip(zip(*[model._examples[x][1] for x in ids]), model._encodeTargets(targets)):
+            self.assertTrue((np.concatenate(buffered) == encoded).all(), "The buffer should hold the encoded targets of every example.")
+
+        #numeric targets are normalized to [-1, 1], categorical targets are option indices 
+        for param,encoded in zip([x[0] for x in model.predictor.output], model._encodeTargets(targets)):
+            for target,val in zip(targets, encoded):
+                if param.type == "categorical":
+                    self.assertEqual(param.options[val], target[param.name], "Categorical targets should be option indices.")
+                else:
+                    self.assertAlmostEqual(float(val[0]), ((target[param.name] - param.lower)/(param.upper - param.lower))*2.0 - 1.0, places=6, msg="Numeric targets should be normalized.")
+
+        self.configDB.setDesirable(ids[:1], False)
+        model._refreshExamples(self.configDB)
+        self.assertEqual(sorted(model._examples), ids[1:], "Records which are no longer desirable should leave the buffer.")
+
+        self.configDB.setDesirable(ids[:1], True)
+        model._refreshExamples(self.configDB)
+        self.assertEqual(sorted(model._examples), ids, "Records which become desirable should enter the buffer.")
+
+    def testFeatureNormalization(self):
+        model1 = NeuralNetwork(159, self.configDef, self.seed, True) 
+        model1.update(self.configDB)
+
+        #the buffered features should be standardized 
+        features = np.concatenate([x[0] for x in model1._examples.values()])
+        standardized = features*model1._featureScale + model1._featureShift
+        self.assertTrue(np.allclose(np.mean(standardized, axis=0), 0, atol=1e-4), "Standardized features should have zero mean.")
+        self.assertTrue(np.allclose(np.std(standardized, axis=0), 1, atol=1e-4), "Standardized features should have unit std.")
+
+        #predictions should depend on the features
+        confs = [model1.generate(x) for x in features[:10]]
+        self.assertTrue(any(x != confs[0] for x in confs), "Different features should produce different configurations.")
+
+        model2 = NeuralNetwork(159, self.configDef, self.seed+1, True) 
+        model2.load(deepcopy(model1.state()))
+        self.assertTrue((model1._featureScale == model2._featureScale).all() and (model1._featureShift == model2._featureShift).all(), "The normalization statistics should be restored by load.")
+
+        #states saved before the statistics were kept use the features unscaled 
+        state = deepcopy(model1.state())
+        del state["featureScale"]
+        del state["featureShift"]
+        model2.load(state)
+        self.assertTrue((model2._featureScale == 1).all() and (model2._featureShift == 0).all(), "Older states should load with identity scaling.")
+
+        #as do generators saved before inference only generators existed 
+        state = AdaptiveGenerator(159, self.configDef, self.seed).getState()
+        del state["inferenceOnly"]
+        del state["remoteInference"]
+        generator = initModel(state)
+        self.assertFalse(generator.inferenceOnly or generator.remoteInference, "Older generator states should load as full generators.")
+
+    def testGenerateBatch(self):
+        model1 = NeuralNetwork(159, self.configDef, self.seed, True) 
+        model2 = NeuralNetwork(159, self.configDef, self.seed, True) 
+        model1.update(self.configDB)
+        model2.load(deepcopy(model1.state()))
+
+        features = np.asarray([[self.rng.random() for x in range(159)] for y in range(20)])
+
+        batch = model1.generateBatch(features)
+        single = [model2.generate(x) for x in features]
+
+        self.assertEqual(len(batch), len(features), "There should be one configuration for each row of features.")
+        for conf1,conf2 in zip(batch, single):
+            self.assertEqual(conf1.keys(), conf2.keys(), "Batched and single generation should produce the same parameters.")
+            for param in conf1:
+                if isinstance(conf1[param], float):
+                    self.assertAlmostEqual(conf1[param], conf2[param], places=4, msg="Batched and single generation should produce the same configurations.")
+                else:
+                    self.assertEqual(conf1[param], conf2[param], "Batched and single generation should produce the same configurations.")
+
+        self.assertEqual(model1.rng.getstate(), model2.rng.getstate(), "Batched generation should consume the rng as single generation does.")
+        self.assertEqual(model1.generateBatch(features[:0]), [], "An empty batch should produce no configurations.")
+
+    def testNumpyNetwork(self):
+        model1 = NeuralNetwork(159, self.configDef, self.seed, True) 
+        model1.update(self.configDB)
+
+        model2 = NumpyNetwork(self.configDef, self.seed+1)
+        model2.load(deepcopy(model1.inferenceState()))
+
+        features = np.asarray([[self.rng.random() for x in range(159)] for y in range(20)])
+
+        for conf1,conf2 in zip(model1.generateBatch(features), model2.generateBatch(features)):
+            self.assertEqual(conf1.keys(), conf2.keys(), "Both networks should produce the same parameters.")
+            for param in conf1:
+                if isinstance(conf1[param], float):
+                    self.assertAlmostEqual(conf1[param], conf2[param], places=4, msg="Both networks should produce the same configurations.")
+                else:
+                    self.assertEqual(conf1[param], conf2[param], "Both networks should produce the same configurations.")
+
+        self.assertEqual(model1.rng.getstate(), model2.rng.getstate(), "Both networks should consume the rng in the same way.")
+
+        model3 = NumpyNetwork(self.configDef, self.seed+2)
+        model3.load(deepcopy(model2.state()))
+        self.assertEqual(model2.generate(features[0]), model3.generate(features[0]), "Saving and restoring the state should not change the output.")
+
+        with self.assertRaises(ModelError):
+            model3.update(self.configDB)
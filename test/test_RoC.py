@@ -19,7 +19,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 from random import Random
 import unittest
 
-from Configurator.RoC import fit
+from Configurator.RoC import fit, fitMany
 
 """
 Sanity checks for RoC
@@ -49,4 +49,23 @@ class TestRoC(unittest.TestCase):
             out3 = fit(vals2) 
             self.assertTrue(out3[0] < out1[0], "Second sequence should have a more negative rate of change.")
 
-  
\ No newline at end of file
+  
+
+    def testBreakpoint(self):
+        #a steep descent which flattens out at x = 20
+        vals = [100 - 5*x for x in range(20)] + [0 - 0.5*x for x in range(80)]
+
+        m1,m2,t,c = fit(vals)
+
+        self.assertEqual(t, 20, "The breakpoint should be found exactly.")
+        self.assertAlmostEqual(m1, -5, msg="The first slope should be recovered.")
+        self.assertAlmostEqual(m2, -0.5, msg="The second slope should be recovered.")
+        self.assertEqual(c, 100, "The intercept should be the first value.")
+
+    def testFitMany(self):
+        series = [[self.rng.random() for x in range(self.rng.randint(1,50))] for y in range(100)]
+
+        out = fitMany(series)
+
+        for vals,row in zip(series, out):
+            self.assertEqual(list(row), fit(vals), "Fitting in a batch should match fitting individually.")
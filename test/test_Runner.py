@@ -16,15 +16,20 @@ You should have received a copy of the GNU Lesser General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import multiprocessing
 from multiprocessing.managers import BaseManager 
 from test.helper import compareFeatures
-from Configurator.ConfigurationGenerator import RandomGenerator
+from Configurator.ConfigurationGenerator import AdaptiveGenerator, RandomGenerator, initModel
 from Configurator.Runner import RandomInstanceRunner
 from Configurator.Algorithm import Algorithm
 from Configurator.TerminationCondition import FELimit
 from Configure import FELimit
 from Configurator.Characterizer import Characterizer
 from random import Random
+from tempfile import TemporaryDirectory
+from Configurator.ConfigurationDB import sqlite3ConfigurationDB
+from Configure import countFEs
+import os
 from test.initializer import getConfigDef, getProblemSuite
 import unittest
 
@@ -43,13 +48,13 @@ class TestRunner(unittest.TestCase):
     def tearDown(self):
         pass
 
-    def _initRunner(self, runnerClass):
+    def _initRunner(self, runnerClass, threads:int=1, inferenceServer:bool=False):
         _,suite = getProblemSuite(self.seed)
         characterizer = Characterizer() 
         condition = FELimit(1000)
         alg = Algorithm("python3 target-algorithm.py", "-d 5", True) 
 
-        rnr = runnerClass(suite, characterizer, condition, self.seed, alg, 1) 
+        rnr = runnerClass(suite, characterizer, condition, self.seed, alg, threads, inferenceServer) 
 
         return rnr
         
@@ -85,8 +90,106 @@ class TestRunner(unittest.TestCase):
 
                 self.assertEqual(c1.toFlags(), c2.toFlags(), "Both configs should have the same values.")
 
+        rndInstRunner1.close()
+        rndInstRunner2.close()
 
+    def testStream(self):
+        rndInstRunner1 = self._initRunner(RandomInstanceRunner) 
+        rndInstRunner2 = self._initRunner(RandomInstanceRunner)
+
+        sampler1 = RandomGenerator(self.confDef, self.seed)  
+        sampler2 = RandomGenerator(self.confDef, self.seed)
+
+        runs1 = rndInstRunner1.schedule(3, 2, sampler1, None) 
+        runs2 = [x for x in rndInstRunner2.stream(3, 2, sampler2, None)]
+
+        key = lambda r: (r.instance.toFlags(), r.configurations[0].seed)
+        self.assertEqual(sorted([key(x) for x in runs1]), sorted([key(x) for x in runs2]), "stream and schedule should perform the same runs.")
+
+        #batches are in the order the runs were scheduled, regardless of which finish first 
+        rndInstRunner3 = self._initRunner(RandomInstanceRunner, 2)
+        sampler3 = RandomGenerator(self.confDef, self.seed)
+        batches = [x for x in rndInstRunner3.streamBatches(3, 2, sampler3, None)]
+        self.assertTrue(all(len(x) > 0 for x in batches), "Empty batches should not be yielded.")
+        self.assertEqual([key(x) for x in runs1], [key(x) for batch in batches for x in batch], "streamBatches should yield runs in the order they were scheduled.")
+
+        rndInstRunner1.close()
+        rndInstRunner2.close()
+        rndInstRunner3.close()
+
+    def testWorkerReuse(self):
+        rndInstRunner = self._initRunner(RandomInstanceRunner)
+        sampler = RandomGenerator(self.confDef, self.seed)
 
+        runs1 = rndInstRunner.schedule(2, 1, sampler, None)
+        workers = [p.pid for p,conn in rndInstRunner.workers]
+        runs2 = rndInstRunner.schedule(2, 1, sampler, None)
 
+        self.assertEqual(workers, [p.pid for p,conn in rndInstRunner.workers], "Workers should persist between calls to schedule.")
+        self.assertEqual(len(runs1) + len(runs2), 4, "Each call should produce a run for each scheduled configuration.")
+
+        modelDir = rndInstRunner._modelDir
+        self.assertEqual(os.listdir(modelDir), ["model_2.pkl"], "Only the latest model snapshot should be kept.")
+
+        rndInstRunner.close()
+        self.assertEqual(len(rndInstRunner.workers), 0, "Closing the runner should stop the workers.")
+        self.assertFalse(os.path.exists(modelDir), "Closing the runner should remove the model snapshot.")
+
+    def testStore(self):
+        rndInstRunner1 = self._initRunner(RandomInstanceRunner) 
+
+        rndInstRunner2 = self._initRunner(RandomInstanceRunner, 2)
+
+        sampler1 = RandomGenerator(self.confDef, self.seed)  
+        sampler2 = RandomGenerator(self.confDef, self.seed)
+
+        with TemporaryDirectory() as path:
+            dbPath = os.path.join(path, "runs.sqlite3")
+            db = sqlite3ConfigurationDB(path=dbPath, initialize=True, seed=self.seed)
+
+            runs = rndInstRunner1.schedule(3, 2, sampler1, None) 
+            #spawned workers each have their own str hash seed, so the identifiers they write must not depend on it 
+            startMethod = multiprocessing.get_start_method()
+            multiprocessing.set_start_method("spawn", force=True)
+            try:
+                rndInstRunner2.store(dbPath, 7, 3, 2, sampler2, None)
+            finally:
+                multiprocessing.set_start_method(startMethod, force=True)
+
+            stored = [x for x in db.recordGenerator()]
+            self.assertEqual(sum([len(x.getRuns()) for x in stored]), len(runs), "Every run should be written to the DB.")
+            self.assertEqual(db.evaluationsConsumed(7), countFEs(runs), "The stored runs should consume the same FEs.")
+            self.assertEqual(db.evaluationsConsumed(0), 0, "The runs should be marked with the iteration they were performed on.")
+
+            #records written by different workers should use the same identifiers as this process
+            self.assertEqual(sorted(set(x.problem() for x in stored)), sorted(set(x.problem() for x in runs)), "Each problem should have one identifier in every process.")
+            self.assertEqual(len(stored), len(set((x.runConfigID(), x.problem()) for x in runs)), "Runs of the same config on the same problem should share a record.")
+            for rcrd in stored:
+                for run in rcrd.getRuns():
+                    self.assertEqual(rcrd.problem(), run.problem())
+
+            rndInstRunner2.close()
+            db.close()
+
+        rndInstRunner1.close()
+
+    def testInferenceServer(self):
+        localRunner = self._initRunner(RandomInstanceRunner)
+        serverRunner = self._initRunner(RandomInstanceRunner, 2, True)
+
+        #mostly informed predictions, from two identical inference only generators 
+        sampler = AdaptiveGenerator(Characterizer().featureSize(), self.confDef, self.seed, minInformedPercent=0.9)
+        sampler1 = initModel(sampler.getInferenceState())
+        sampler2 = initModel(sampler.getInferenceState())
+
+        runs1 = localRunner.schedule(3, 2, sampler1, None)
+        runs2 = serverRunner.schedule(3, 2, sampler2, None)
+
+        self.assertTrue(any(c.generationMethod == "Informed" for r in runs1 for c in r.configurations), "Some configurations should be predicted.")
+        for r1, r2 in zip(runs1,runs2):
+            self.assertEqual([c.toFlags() for c in r1.configurations], [c.toFlags() for c in r2.configurations], "The inference server should make the same predictions as the runs would.")
+            self.assertEqual([c.generationMethod for c in r1.configurations], [c.generationMethod for c in r2.configurations], "The inference server should not change how configurations are generated.")
 
-  
\ No newline at end of file
+        localRunner.close()
+        serverRunner.close()
+        self.assertIsNone(serverRunner.server, "Closing the runner should stop the inference server.")